@@ -0,0 +1,163 @@
+"""
+RAWASI Insight Cache
+Content-addressed cache for AI recommendation insights (memory LRU + SQLite)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from instrumentation import get_logger
+from sqlite_tier import SQLiteTier
+from ttl_cache import SingleFlight, TTLCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = get_logger('insight_cache')
+
+INSIGHT_CACHE_PATH = os.getenv('INSIGHT_CACHE_PATH', os.path.join(BASE_DIR, '.cache', 'insights.sqlite3'))
+INSIGHT_CACHE_SIZE = int(os.getenv('INSIGHT_CACHE_SIZE', 512))
+INSIGHT_CACHE_TTL = float(os.getenv('INSIGHT_CACHE_TTL', 24 * 3600))
+INSIGHT_CACHE_DISK_MAX = int(os.getenv('INSIGHT_CACHE_DISK_MAX', 10000))
+
+# Project sizes within the same band share insights
+INSIGHT_SIZE_BAND_SQM = float(os.getenv('INSIGHT_SIZE_BAND_SQM', 500))
+
+# Number of top suppliers included in the insights prompt
+TOP_SUPPLIERS = 3
+
+
+def _normalize_text(value, default):
+    return ' '.join(str(value if value is not None else default).split()).lower()
+
+
+def insight_key(project_data, matching_suppliers):
+    """
+    Hash of the normalized inputs that shape the insights
+
+    Covers project type, location, size band, technologies (order and case
+    insensitive), complexity score and the names of the top suppliers.
+    Free-text fields such as the project name are deliberately left out.
+    """
+    try:
+        size_band = int(float(project_data.get('sizeSqm')) // INSIGHT_SIZE_BAND_SQM)
+    except (TypeError, ValueError):
+        size_band = None
+
+    profile = {
+        'type': _normalize_text(project_data.get('type'), 'Residential'),
+        'location': _normalize_text(project_data.get('location'), ''),
+        'size_band': size_band,
+        'techs': sorted({_normalize_text(t, '') for t in project_data.get('techNeeds', [])}),
+        'complexity': project_data.get('complexity_score'),
+        'suppliers': [s.get('name') for s in matching_suppliers[:TOP_SUPPLIERS]]
+    }
+    payload = json.dumps(profile, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class InsightStore(SQLiteTier):
+    """On-disk insight entries with TTL and a row limit"""
+
+    def __init__(self, path, ttl, max_rows):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._writes = 0
+
+    def _setup(self, conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS insights ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS insights_created ON insights (created)')
+
+    def get(self, key):
+        with self._lock:
+            row = self.connection().execute(
+                'SELECT value, created FROM insights WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or (self.ttl and row[1] + self.ttl <= time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            conn = self.connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO insights (key, value, created) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), time.time())
+            )
+            self._writes += 1
+            # Prune expired and oldest-beyond-limit rows every so often
+            if self._writes % 100 == 1:
+                if self.ttl:
+                    conn.execute('DELETE FROM insights WHERE created <= ?', (time.time() - self.ttl,))
+                conn.execute(
+                    'DELETE FROM insights WHERE key IN ('
+                    'SELECT key FROM insights ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                    (self.max_rows,)
+                )
+            conn.commit()
+
+
+class InsightCache:
+    """
+    Two-tier cache in front of get_ai_insights
+
+    Lookups check the in-memory LRU, then SQLite (promoting hits back into
+    memory). Misses for the same key arriving together are coalesced so
+    only one LLM call is made. Only successful insights are stored.
+    """
+
+    def __init__(self, path=INSIGHT_CACHE_PATH, maxsize=INSIGHT_CACHE_SIZE,
+                 ttl=INSIGHT_CACHE_TTL, disk_max=INSIGHT_CACHE_DISK_MAX):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.disk = InsightStore(path, ttl, disk_max) if path else None
+        self.flights = SingleFlight()
+        self.disk_hits = 0
+        self.disk_errors = 0
+
+    def get_or_compute(self, key, compute):
+        """Return the cached insights for key, calling compute() on a miss"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        return self.flights.do(key, self._load, key, compute)
+
+    def _load(self, key, compute):
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                self.disk_errors += 1
+                log.warning("⚠️ Insight cache read failed", error=str(e))
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+
+        value = compute()
+        if value is not None:
+            self.memory.set(key, value)
+            if self.disk is not None:
+                try:
+                    self.disk.set(key, value)
+                except sqlite3.Error as e:
+                    self.disk_errors += 1
+                    log.warning("⚠️ Insight cache write failed", error=str(e))
+        return value
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        stats = self.memory.stats()
+        stats.update({
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "disk_path": self.disk.path if self.disk is not None else None,
+            "single_flight": self.flights.stats()
+        })
+        return stats
@@ -0,0 +1,163 @@
+"""
+RAWASI Plan Cache
+Perceptual-hash cache for construction plan complexity analysis
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from instrumentation import get_logger
+from sqlite_tier import SQLiteTier
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = get_logger('plan_cache')
+
+PLAN_CACHE_PATH = os.getenv('PLAN_CACHE_PATH', os.path.join(BASE_DIR, '.cache', 'plans.sqlite3'))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv('PLAN_CACHE_MAX_ENTRIES', 2000))
+
+# Maximum Hamming distance (out of 64 bits) for two plans to count as the same
+PLAN_HASH_MAX_DISTANCE = int(os.getenv('PLAN_HASH_MAX_DISTANCE', 4))
+
+# pHash: DCT of a 32x32 grayscale thumbnail, keeping the 8x8 lowest frequencies
+HASH_IMAGE_SIZE = 32
+HASH_SIZE = 8
+
+_n = np.arange(HASH_IMAGE_SIZE)
+_DCT = np.sqrt(2.0 / HASH_IMAGE_SIZE) * np.cos(
+    np.pi * (2 * _n[None, :] + 1) * _n[:, None] / (2 * HASH_IMAGE_SIZE)
+)
+_DCT[0] /= np.sqrt(2.0)
+
+# Set-bit count of every byte value, for Hamming distances without bitwise_count
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image):
+    """
+    64-bit DCT perceptual hash of a PIL image
+
+    Resized, re-encoded or slightly recompressed copies of the same drawing
+    produce identical or nearly identical hashes. Returned as a signed
+    64-bit int so it can be stored directly in SQLite.
+    """
+    gray = image.convert('L').resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # Compare against the median of the AC terms; the DC term only encodes brightness
+    bits = low > np.median(low[1:])
+    value = int(np.packbits(bits).view('>u8')[0])
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming_distances(target, hashes):
+    """Bit differences between target and each hash in a signed int64 array"""
+    diff = np.bitwise_xor(np.asarray(hashes, dtype=np.int64), np.int64(target))
+    return _POPCOUNT[diff.view(np.uint8)].reshape(len(diff), 8).sum(axis=1)
+
+
+class PlanCache(SQLiteTier):
+    """
+    Persistent plan-analysis cache keyed on perceptual hash
+
+    Each entry keeps the raw analysis text and its parsed complexity score.
+    Lookups return the closest stored plan within max_distance bits.
+    Least-recently-used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, path=PLAN_CACHE_PATH, max_entries=PLAN_CACHE_MAX_ENTRIES,
+                 max_distance=PLAN_HASH_MAX_DISTANCE):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _setup(self, conn):
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS plans ('
+            'phash INTEGER PRIMARY KEY, analysis TEXT NOT NULL, score INTEGER NOT NULL, '
+            'created REAL NOT NULL, accessed REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS plans_accessed ON plans (accessed)')
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, phash):
+        """Return (analysis_text, score) for the nearest cached plan, or None"""
+        try:
+            with self._lock:
+                conn = self.connection()
+                row = conn.execute(
+                    'SELECT phash, analysis, score FROM plans WHERE phash = ?', (phash,)
+                ).fetchone()
+
+                if row is None and self.max_distance > 0:
+                    hashes = [h for (h,) in conn.execute('SELECT phash FROM plans')]
+                    if hashes:
+                        distances = hamming_distances(phash, hashes)
+                        nearest = int(np.argmin(distances))
+                        if distances[nearest] <= self.max_distance:
+                            row = conn.execute(
+                                'SELECT phash, analysis, score FROM plans WHERE phash = ?',
+                                (hashes[nearest],)
+                            ).fetchone()
+
+                if row is None:
+                    self._count('misses')
+                    return None
+
+                conn.execute('UPDATE plans SET accessed = ? WHERE phash = ?', (time.time(), row[0]))
+                conn.commit()
+        except Exception as e:
+            self._count('errors')
+            log.warning("⚠️ Plan cache read failed", error=str(e))
+            return None
+
+        self._count('hits' if row[0] == phash else 'near_hits')
+        return row[1], row[2]
+
+    def set(self, phash, analysis_text, score):
+        """Store an analysis, evicting the least recently used plans if full"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self.connection()
+                conn.execute(
+                    'INSERT OR REPLACE INTO plans (phash, analysis, score, created, accessed) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (phash, analysis_text, int(score), now, now)
+                )
+                conn.execute(
+                    'DELETE FROM plans WHERE phash IN ('
+                    'SELECT phash FROM plans ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+                conn.commit()
+        except Exception as e:
+            self._count('errors')
+            log.warning("⚠️ Plan cache write failed", error=str(e))
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        with self._stats_lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "path": self.path,
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                "errors": self.errors
+            }
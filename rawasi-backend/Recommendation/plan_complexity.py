@@ -0,0 +1,195 @@
+"""
+RAWASI Local Plan Complexity
+Deterministic NumPy/PIL complexity estimate for construction plan images
+
+Run directly for the calibration benchmark on the bundled plans:
+    python plan_complexity.py [image ...]
+"""
+
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# Plans are analysed at this longest side so timings don't depend on upload size
+ANALYSIS_SIDE = 512
+
+# Minimum straight run (fraction of the longest side) counted as a drawn line
+MIN_LINE_FRACTION = 0.03
+
+# Feature -> (weight, value at which the feature saturates); weights sum to 1.
+# Calibrated with the benchmark below on the bundled plans.
+FEATURE_WEIGHTS = {
+    'line_segments': (0.40, 400),
+    'enclosed_regions': (0.25, 800),
+    'edge_density': (0.20, 0.20),
+    'extent': (0.15, 1.0),
+}
+
+
+def _otsu_threshold(gray):
+    """Grey level that best separates ink from background"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(float)
+    weights = np.cumsum(hist)
+    means = np.cumsum(hist * np.arange(256))
+    total, total_mean = weights[-1], means[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (total_mean * weights - means * total) ** 2 / (weights * (total - weights))
+    return int(np.nanargmax(between[:-1]))
+
+
+def _long_runs(ink, min_length):
+    """Mask of ink pixels lying on horizontal runs of at least min_length"""
+    rows, cols = ink.shape
+    # A zero column after every row keeps runs from wrapping onto the next row
+    padded = np.zeros((rows, cols + 1), dtype=bool)
+    padded[:, :cols] = ink
+    flat = padded.ravel()
+    starts = np.empty_like(flat)
+    starts[0] = flat[0]
+    starts[1:] = flat[1:] & ~flat[:-1]
+    run_ids = np.cumsum(starts)
+    lengths = np.bincount(run_ids, weights=flat)
+    mask = flat & (lengths[run_ids] >= min_length)
+    return mask.reshape(rows, cols + 1)[:, :cols]
+
+
+def _segment_count(runs):
+    """Distinct line segments in a run mask (run starts not continuing the row above)"""
+    starts = runs.copy()
+    starts[:, 1:] &= ~runs[:, :-1]
+    starts[1:, :] &= ~runs[:-1, :]
+    return int(starts.sum())
+
+
+def _euler_number(ink):
+    """Euler number (components minus holes) of the 8-connected ink"""
+    padded = np.pad(ink, 1).astype(np.uint8)
+    quads = (padded[:-1, :-1] + 2 * padded[:-1, 1:]
+             + 4 * padded[1:, :-1] + 8 * padded[1:, 1:])
+    counts = np.bincount(quads.ravel(), minlength=16)
+    q1 = counts[[1, 2, 4, 8]].sum()
+    q3 = counts[[7, 11, 13, 14]].sum()
+    qd = counts[[6, 9]].sum()
+    return int((q1 - q3 - 2 * qd) // 4)
+
+
+def plan_features(image):
+    """
+    Drawing features of a plan image
+
+    Returns:
+    - dict with edge_density (fraction of ink outline pixels), line_segments
+      (straight horizontal/vertical runs), euler_number (components minus
+      holes), enclosed_regions (holes in excess of components, a proxy for
+      rooms, hatching and curved detail), extent (drawing bounding box /
+      image area) and ink_ratio
+    """
+    # Every plan is resampled to the same size so features are scale independent
+    gray = image.convert('L')
+    scale = ANALYSIS_SIDE / max(gray.size)
+    size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+    gray = gray.resize(size, Image.BOX if scale < 1 else Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.uint8)
+
+    ink = pixels <= _otsu_threshold(pixels)
+    # Light-on-dark drawings (or a near-blank page): treat the minority as ink
+    if ink.mean() > 0.5:
+        ink = ~ink
+
+    # Ink pixels with a background 4-neighbour form the drawing outline
+    padded = np.pad(ink, 1)
+    interior = (padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:])
+    outline = ink & ~interior
+
+    min_length = max(3, int(MIN_LINE_FRACTION * max(pixels.shape)))
+    line_segments = (_segment_count(_long_runs(ink, min_length))
+                     + _segment_count(_long_runs(ink.T, min_length)))
+
+    euler = _euler_number(ink)
+
+    ys, xs = np.nonzero(ink)
+    if len(xs):
+        # Trim 1% outliers (stray marks, frame corners) from the bounding box
+        x0, x1 = np.percentile(xs, [1, 99])
+        y0, y1 = np.percentile(ys, [1, 99])
+        extent = float((x1 - x0 + 1) * (y1 - y0 + 1) / ink.size)
+    else:
+        extent = 0.0
+
+    return {
+        'edge_density': round(float(outline.mean()), 4),
+        'line_segments': line_segments,
+        'euler_number': euler,
+        'enclosed_regions': max(0, -euler),
+        'extent': round(min(extent, 1.0), 4),
+        'ink_ratio': round(float(ink.mean()), 4),
+    }
+
+
+def complexity_from_features(features):
+    """Map plan features onto the 1-10 complexity scale"""
+    total = 0.0
+    for name, (weight, saturation) in FEATURE_WEIGHTS.items():
+        normalized = float(features[name]) / saturation
+        total += weight * min(max(normalized, 0.0), 1.0)
+    return int(min(max(round(1 + 9 * total), 1), 10))
+
+
+def estimate_complexity(image):
+    """
+    Local complexity estimate for a plan image
+
+    Returns:
+    - (analysis_text, complexity_score, features); the text uses the same
+      "Complexity Score: X/10" format as the vision model
+    """
+    features = plan_features(image)
+    score = complexity_from_features(features)
+    analysis_text = (
+        f"Complexity Score: {score}/10\n"
+        f"Explanation: Local estimate from drawing features - edge density "
+        f"{features['edge_density']:.2f}, {features['line_segments']} line segments, "
+        f"{features['enclosed_regions']} enclosed regions, drawing extent {features['extent']:.0%}."
+    )
+    return analysis_text, score, features
+
+
+def _variants(image):
+    """Resized and re-encoded copies of a plan, as users resubmit them"""
+    yield 'original', image
+    for side in (256, 1024, 2048):
+        copy = image.copy()
+        scale = side / max(copy.size)
+        yield f'{side}px', copy.resize((round(copy.width * scale), round(copy.height * scale)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, 'JPEG', quality=60)
+    buffer.seek(0)
+    yield 'jpeg q60', Image.open(buffer)
+
+
+def calibration_benchmark(paths, repeats=20):
+    """Score each plan and its variants, reporting features and timings"""
+    print(f"{'plan':<12} {'variant':<10} {'score':>5} {'ms':>7}  features")
+    for path in paths:
+        image = Image.open(path)
+        image.load()
+        scores = []
+        for variant, copy in _variants(image):
+            copy.load()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                _, score, features = estimate_complexity(copy)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / repeats
+            scores.append(score)
+            print(f"{os.path.basename(path):<12} {variant:<10} {score:>5} {elapsed_ms:>7.1f}  {features}")
+        print(f"{os.path.basename(path):<12} {'spread':<10} {max(scores) - min(scores):>5}")
+
+
+if __name__ == '__main__':
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    plans = sys.argv[1:] or [os.path.join(base_dir, 'plan1.png'), os.path.join(base_dir, 'plan2.jpg')]
+    calibration_benchmark(plans)
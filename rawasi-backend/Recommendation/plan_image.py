@@ -0,0 +1,145 @@
+"""
+RAWASI Plan Image Ingestion
+Bounded-memory loading of uploaded construction plans for the vision model
+"""
+
+import base64
+import binascii
+import os
+import tempfile
+
+from PIL import Image
+
+# Largest accepted plan file (bytes); request bodies are capped slightly above
+# this to leave room for base64 overhead and the other form fields
+MAX_PLAN_BYTES = int(float(os.getenv('MAX_PLAN_MB', 25)) * 1024 * 1024)
+MAX_REQUEST_BYTES = MAX_PLAN_BYTES * 4 // 3 + 1024 * 1024
+
+# Largest accepted plan resolution, checked from the header before decoding
+MAX_PLAN_PIXELS = int(os.getenv('MAX_PLAN_PIXELS', 80_000_000))
+
+# Longest side sent to the vision model; larger plans are downscaled
+VISION_MAX_SIDE = int(os.getenv('VISION_MAX_SIDE', 1568))
+
+# Raw uploads are kept in memory up to this size, then spooled to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+COPY_CHUNK_BYTES = 64 * 1024
+
+
+class PlanImageError(ValueError):
+    """The uploaded plan is not a readable image"""
+
+
+class PlanImageTooLarge(PlanImageError):
+    """The uploaded plan exceeds the byte or pixel limits"""
+
+
+def spool_stream(stream, max_bytes=MAX_PLAN_BYTES):
+    """Copy a request body stream into a spooled temporary file"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    total = 0
+    while True:
+        chunk = stream.read(COPY_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            spooled.close()
+            raise PlanImageTooLarge(f"Plan image exceeds {max_bytes // (1024 * 1024)} MB")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def spool_base64(image_data, max_bytes=MAX_PLAN_BYTES):
+    """Decode a base64 (optionally data-URL) plan string into a spooled file"""
+    if ',' in image_data:
+        image_data = image_data.split(',')[1]
+    if any(c in image_data for c in '\r\n '):
+        image_data = ''.join(image_data.split())
+    if len(image_data) * 3 // 4 > max_bytes:
+        raise PlanImageTooLarge(f"Plan image exceeds {max_bytes // (1024 * 1024)} MB")
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    # Decode in 4-character-aligned slices so the full bytes never coexist with the string
+    step = COPY_CHUNK_BYTES // 3 * 4
+    try:
+        for start in range(0, len(image_data), step):
+            spooled.write(base64.b64decode(image_data[start:start + step]))
+    except (binascii.Error, ValueError) as e:
+        spooled.close()
+        raise PlanImageError(f"Invalid base64 plan image: {e}")
+    spooled.seek(0)
+    return spooled
+
+
+def open_plan_image(fileobj, max_side=VISION_MAX_SIDE, max_pixels=MAX_PLAN_PIXELS):
+    """
+    Open, validate and downscale a plan image
+
+    The header is read lazily so oversized images are rejected before any
+    pixel data is decoded. JPEGs are decoded directly at a reduced scale
+    (Image.draft); other formats are shrunk with integer box reduction
+    and a final resample to max_side.
+
+    Parameters:
+    - fileobj: binary file object positioned at the start of the image
+    - max_side: longest side of the returned image
+    - max_pixels: largest accepted width * height
+
+    Returns:
+    - Loaded PIL image no larger than max_side on either side
+    """
+    try:
+        image = Image.open(fileobj)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise PlanImageError(f"Unreadable plan image: {e}")
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise PlanImageTooLarge(f"Plan image is {width}x{height}; at most {max_pixels:,} pixels are accepted")
+
+    scale = max(width, height) / max_side
+    if scale > 1 and image.format == 'JPEG':
+        # Decode at 1/2, 1/4 or 1/8 scale, never below the target size
+        image.draft(image.mode, (int(width / scale), int(height / scale)))
+
+    try:
+        image.load()
+    except OSError as e:
+        raise PlanImageError(f"Unreadable plan image: {e}")
+
+    factor = int(max(image.size) // max_side)
+    if max(image.size) > max_side and image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    if factor > 1:
+        image = image.reduce(factor)
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+
+def load_plan_image(source):
+    """
+    Load a plan from a base64 string, an upload or a raw body stream
+
+    Parameters:
+    - source: base64/data-URL string, or a binary file object
+
+    Returns:
+    - Downscaled PIL image (see open_plan_image)
+    """
+    if isinstance(source, str):
+        fileobj = spool_base64(source)
+    elif source.seekable():
+        # Uploads are already spooled by werkzeug; check the size without reading
+        source.seek(0, os.SEEK_END)
+        if source.tell() > MAX_PLAN_BYTES:
+            raise PlanImageTooLarge(f"Plan image exceeds {MAX_PLAN_BYTES // (1024 * 1024)} MB")
+        source.seek(0)
+        return open_plan_image(source)
+    else:
+        fileobj = spool_stream(source)
+
+    with fileobj:
+        return open_plan_image(fileobj)
@@ -4,55 +4,122 @@ RAWASI Provider Recommendation API
 Connects React frontend with LLM recommendation engine
 """
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
-import google.generativeai as genai
+from werkzeug.exceptions import RequestEntityTooLarge
 import json
 import os
 from dotenv import load_dotenv
 from PIL import Image
-import io
-import base64
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as StageTimeout
+
+# Shared backend modules (ttl_cache, ...) live one directory up. gunicorn.conf.py
+# and gateway.py put them on the path; this covers running the file directly.
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from insight_cache import InsightCache, insight_key
+from instrumentation import get_logger, instrument_app, run_in_context, stage
+from llm_gateway import gateway as llm_gateway
+from plan_cache import PlanCache, perceptual_hash
+from plan_complexity import estimate_complexity
+from plan_image import MAX_REQUEST_BYTES, PlanImageError, PlanImageTooLarge, load_plan_image
+from supplier_index import SupplierIndex
+from supplier_store import SupplierStore
 
 # Load environment variables
 load_dotenv('.env')
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React frontend
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUPPLIERS_FILE = os.path.join(BASE_DIR, 'modern_building_contractors - En.json')
+
+bp = Blueprint('recommendation', __name__)
+log = get_logger('recommendation')
+
+# Per-stage deadlines (seconds) for the /api/recommend pipeline
+PLAN_ANALYSIS_TIMEOUT = float(os.getenv('PLAN_ANALYSIS_TIMEOUT', 25))
+AI_INSIGHTS_TIMEOUT = float(os.getenv('AI_INSIGHTS_TIMEOUT', 20))
+
+# Plan complexity engine: 'llm' (vision model), 'local' (plan_complexity) or
+# 'hedge' (vision model, falling back to the local estimate if it misses its
+# deadline or fails). Requests can override it with complexityEngine.
+COMPLEXITY_ENGINES = ('llm', 'local', 'hedge')
+COMPLEXITY_ENGINE = os.getenv('COMPLEXITY_ENGINE', 'hedge')
+
+# Threads for LLM stages that run alongside supplier matching
+pipeline_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PIPELINE_WORKERS', 8)),
+    thread_name_prefix='recommend'
+)
+
+class PipelineStage:
+    """A pipeline step running on pipeline_executor with its own deadline"""
+    
+    def __init__(self, name, timeout, fn, *args):
+        self.name = name
+        self.timeout = timeout
+        self.started = time.monotonic()
+        # Runs in the request's context so its stage timings count towards the request
+        self.future = run_in_context(pipeline_executor, self._run, fn, *args)
+    
+    @staticmethod
+    def _run(fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, (time.perf_counter() - start) * 1000
+    
+    def result(self, stages):
+        """Wait for the stage until its deadline; returns None on timeout or error"""
+        remaining = max(0.0, self.timeout - (time.monotonic() - self.started))
+        try:
+            result, elapsed_ms = self.future.result(timeout=remaining)
+            stages[self.name] = {'status': 'ok', 'ms': round(elapsed_ms, 1)}
+            return result
+        except StageTimeout:
+            stages[self.name] = {'status': 'timeout', 'ms': round(self.timeout * 1000, 1)}
+            log.warning(f"⏱️ Stage '{self.name}' missed its deadline, continuing without it",
+                        stage=self.name, timeout_seconds=self.timeout)
+        except Exception as e:
+            stages[self.name] = {'status': 'error', 'error': str(e)}
+            log.warning(f"⚠️ Stage '{self.name}' failed", stage=self.name, error=str(e))
+        return None
 
 class SupplierRecommendationAPI:
     def __init__(self):
-        api_key = os.getenv('GEMINI_API_KEY')
-        if api_key:
+        if llm_gateway.enabled:
             try:
-                genai.configure(api_key=api_key)
                 model_name = 'models/gemini-2.0-flash-exp'
-                self.model = genai.GenerativeModel(model_name)
+                # Calls go through the shared gateway (concurrency cap, timeouts, retries, breaker)
+                self.model = llm_gateway.client(model_name)
                 self.vision_model = self.model
                 self.ai_enabled = True
-                print(f"✅ AI features enabled using: {model_name}")
+                log.info("✅ AI features enabled", model=model_name)
             except Exception as e:
-                print(f"⚠️ AI initialization failed: {e}")
+                log.warning("⚠️ AI initialization failed", error=str(e))
                 self.ai_enabled = False
         else:
-            print("⚠️ No API key found - using basic matching")
+            log.warning("⚠️ No API key found - using basic matching")
             self.ai_enabled = False
         
         # Load suppliers data
         self.suppliers_data = self.load_suppliers_data()
         self.tech_complexity_data = self.load_tech_complexity_data()
+        self.supplier_index = SupplierIndex(self.suppliers_data, self.tech_complexity_data)
+        self.insight_cache = InsightCache()
+        self.plan_cache = PlanCache()
     
     def load_suppliers_data(self):
-        """Load suppliers data from the JSON file"""
+        """Load suppliers into a columnar store (cached next to the JSON file)"""
         try:
-            with open('modern_building_contractors - En.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                print(f"✅ Loaded {len(data)} suppliers from JSON file")
-                return data
+            data = SupplierStore.load(SUPPLIERS_FILE)
+            log.info(f"✅ Loaded {len(data)} suppliers from JSON file", suppliers=len(data))
+            return data
         except Exception as e:
-            print(f"❌ Error reading JSON file: {e}")
-            return []
+            log.error("❌ Error reading JSON file", path=SUPPLIERS_FILE, error=str(e))
+            return SupplierStore.from_records([])
     
     def load_tech_complexity_data(self):
         """Load technology complexity data matching your frontend options"""
@@ -74,20 +141,66 @@ class SupplierRecommendationAPI:
             "Prefabrication": {"complexity_range": (4, 8), "alias": ["Prefab"]},
         }
     
-    def analyze_construction_plan(self, image_data):
-        """Analyze construction plan complexity using AI"""
+    def decode_plan_image(self, image_data):
+        """Decode a base64 (optionally data-URL) plan image, downscaled for the vision model"""
+        return load_plan_image(image_data)
+    
+    def assess_construction_plan(self, image_data):
+        """
+        Complexity analysis for a plan image, reusing cached results
+        
+        Plans are keyed on a perceptual hash, so resized or re-encoded copies
+        of a previously analyzed drawing skip the vision call.
+        
+        Parameters:
+        - image_data: PIL image (see plan_image.load_plan_image) or base64 string
+        
+        Returns:
+        - (analysis_text, complexity_score), or None if analysis failed
+        """
         if not self.ai_enabled:
             return None
         
         try:
-            # Decode base64 image
-            if ',' in image_data:
-                image_bytes = base64.b64decode(image_data.split(',')[1])
-            else:
-                image_bytes = base64.b64decode(image_data)
-            
-            image = Image.open(io.BytesIO(image_bytes))
-            
+            image = image_data if isinstance(image_data, Image.Image) else self.decode_plan_image(image_data)
+            phash = perceptual_hash(image)
+        except Exception as e:
+            log.warning("⚠️ Error analyzing image", error=str(e))
+            return None
+        
+        cached = self.plan_cache.get(phash)
+        if cached:
+            log.info("♻️ Reusing cached analysis for a matching plan", phash=phash)
+            return cached
+        
+        complexity_analysis = self.analyze_plan_image(image)
+        if not complexity_analysis:
+            return None
+        
+        complexity_score = self.parse_complexity_score(complexity_analysis)
+        self.plan_cache.set(phash, complexity_analysis, complexity_score)
+        return complexity_analysis, complexity_score
+    
+    def estimate_local_complexity(self, image, stages):
+        """
+        Complexity analysis from drawing features, without the vision model
+        
+        Returns:
+        - (analysis_text, complexity_score), or None if the image can't be analysed
+        """
+        start = time.perf_counter()
+        try:
+            complexity_analysis, complexity_score, _ = estimate_complexity(image)
+        except Exception as e:
+            stages['local_complexity'] = {'status': 'error', 'error': str(e)}
+            log.warning("⚠️ Local complexity estimate failed", error=str(e))
+            return None
+        stages['local_complexity'] = {'status': 'ok', 'ms': round((time.perf_counter() - start) * 1000, 1)}
+        return complexity_analysis, complexity_score
+    
+    def analyze_plan_image(self, image):
+        """Send a decoded plan image to the vision model"""
+        try:
             prompt = """
             Analyze this construction plan and evaluate its complexity on a scale of 1 to 10.
             Consider these factors:
@@ -108,7 +221,7 @@ class SupplierRecommendationAPI:
             return response.text
             
         except Exception as e:
-            print(f"⚠️ Error analyzing image: {e}")
+            log.warning("⚠️ Error analyzing image", error=str(e))
             return None
     
     def parse_complexity_score(self, analysis_text):
@@ -125,7 +238,7 @@ class SupplierRecommendationAPI:
                         score = int(numbers[0])
                         return min(max(score, 1), 10)
         except Exception as e:
-            print(f"⚠️ Error parsing complexity score: {e}")
+            log.warning("⚠️ Error parsing complexity score", error=str(e))
         
         return 5  # Default medium complexity
     
@@ -150,7 +263,6 @@ class SupplierRecommendationAPI:
     
     def find_matching_suppliers(self, project_data):
         """Find matching suppliers based on project requirements"""
-        matching_suppliers = []
         target_location = project_data.get('location', '').strip()
         target_techs = project_data.get('techNeeds', [])
         
@@ -158,89 +270,24 @@ class SupplierRecommendationAPI:
         if not target_techs:
             target_techs = ['BIM']
         
-        print(f"🔍 Searching for suppliers in '{target_location}' with technologies: {target_techs}")
-        
-        for supplier in self.suppliers_data:
-            supplier_name = supplier.get('Contractor_Name') or supplier.get('Factory_Name')
-            if not supplier_name:
-                continue
-            
-            supplier_tech = supplier.get('Building_Tech_Type') or supplier.get('Tech_Type', '')
-            if not supplier_tech:
-                continue
-            
-            supplier_region = supplier.get('Preferred_Region', '')
-            actual_rating = supplier.get('totalScore', 'N/A')
-            
-            # Check region match
-            region_match = (
-                target_location.lower() in supplier_region.lower() or
-                supplier_region.lower() in target_location.lower() or
-                'all' in supplier_region.lower()
-            )
-            
-            # Check technology match (match ANY of the selected technologies)
-            tech_match = False
-            matched_tech = None
-            for tech in target_techs:
-                if tech.lower() in supplier_tech.lower():
-                    tech_match = True
-                    matched_tech = tech
-                    break
-                # Check aliases
-                tech_data = self.tech_complexity_data.get(tech, {})
-                for alias in tech_data.get('alias', []):
-                    if alias.lower() in supplier_tech.lower():
-                        tech_match = True
-                        matched_tech = tech
-                        break
-                if tech_match:
-                    break
-            
-            # Calculate match score
-            match_score = 0
-            match_reasons = []
-            
-            if region_match:
-                match_score += 50
-                match_reasons.append("Region match")
-            
-            if tech_match:
-                match_score += 50
-                match_reasons.append("Technology expertise")
-            
-            # Rating bonus
-            if isinstance(actual_rating, (int, float)):
-                rating_bonus = (actual_rating - 3.0) * 10
-                match_score += rating_bonus
-            
-            # Only include if technology matches
-            if tech_match:
-                matching_suppliers.append({
-                    'name': supplier_name,
-                    'alliance': supplier.get('Alliance_Company_Name', 'N/A'),
-                    'region': supplier_region,
-                    'technology': supplier_tech,
-                    'rating': actual_rating,
-                    'contact': supplier.get('Contact_Person', 'N/A'),
-                    'email': supplier.get('Email', 'N/A'),
-                    'phone': supplier.get('Mobile_Number', 'N/A'),
-                    'match_score': round(match_score, 1),
-                    'match_reasons': match_reasons,
-                    'region_match': region_match,
-                    'tech_match': tech_match,
-                    'matched_technology': matched_tech
-                })
+        log.debug("🔍 Searching for suppliers", location=target_location, technologies=target_techs)
         
-        # Sort by match score
-        matching_suppliers.sort(key=lambda x: x['match_score'], reverse=True)
-        return matching_suppliers
+        # Set intersections over the prebuilt technology/region index
+        with stage('supplier_match'):
+            return self.supplier_index.match(target_location, target_techs)
     
     def get_ai_insights(self, project_data, matching_suppliers):
-        """Get AI-powered insights about the recommendations"""
+        """Get AI-powered insights, reusing cached ones for the same profile and top suppliers"""
         if not self.ai_enabled or not matching_suppliers:
             return None
         
+        key = insight_key(project_data, matching_suppliers)
+        return self.insight_cache.get_or_compute(
+            key, lambda: self.generate_ai_insights(project_data, matching_suppliers)
+        )
+    
+    def generate_ai_insights(self, project_data, matching_suppliers):
+        """Ask the model for insights about the recommendations (uncached)"""
         try:
             prompt = f"""
             # SUPPLIER RECOMMENDATION INSIGHTS
@@ -289,31 +336,105 @@ class SupplierRecommendationAPI:
                 }
                 
         except Exception as e:
-            print(f"⚠️ Error generating AI insights: {e}")
+            log.warning("⚠️ Error generating AI insights", error=str(e))
             return None
 
-# Initialize the API
-recommendation_api = SupplierRecommendationAPI()
+# Initialized by create_app() so suppliers are loaded once per process tree
+recommendation_api = None
+
+def init_service():
+    """
+    Load suppliers and configure the AI client once
+    
+    Returns:
+    - List of hooks to run in each forked worker (none needed)
+    """
+    global recommendation_api
+    if recommendation_api is None:
+        recommendation_api = SupplierRecommendationAPI()
+    return []
+
+def create_app():
+    """
+    Application factory
+    
+    Loads suppliers and configures the AI client once. Under gunicorn with
+    preload_app (see gunicorn.conf.py) this runs in the master, so workers
+    share the supplier data through fork copy-on-write.
+    
+    Usage: gunicorn -c gunicorn.conf.py -b 0.0.0.0:5001 --chdir Recommendation 'recommendation_api:create_app()'
+    """
+    post_fork = init_service()
+    
+    app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+    CORS(app)  # Enable CORS for React frontend
+    app.register_blueprint(bp)
+    instrument_app(app)
+    app.extensions['post_fork'] = post_fork
+    return app
 
 # API Endpoints
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'ai_enabled': recommendation_api.ai_enabled,
-        'suppliers_loaded': len(recommendation_api.suppliers_data)
+        'suppliers_loaded': len(recommendation_api.suppliers_data),
+        'insight_cache': recommendation_api.insight_cache.stats(),
+        'plan_cache': recommendation_api.plan_cache.stats(),
+        'llm': llm_gateway.stats()
     })
 
-@app.route('/api/recommend', methods=['POST'])
+NUMERIC_FORM_FIELDS = ('sizeSqm', 'budget', 'timelineMonths', 'Nfloors')
+
+def form_fields(fields):
+    """Project fields sent as form fields or query parameters"""
+    data = fields.to_dict()
+    if 'techNeeds' in fields:
+        data['techNeeds'] = fields.getlist('techNeeds')
+    for key in NUMERIC_FORM_FIELDS:
+        if key in data:
+            try:
+                value = float(data[key])
+                data[key] = int(value) if value.is_integer() else value
+            except ValueError:
+                pass
+    return data
+
+def read_recommendation_request():
+    """
+    Project fields and plan image source for /api/recommend
+    
+    Accepts JSON (planImage as base64), multipart/form-data (planImage as a
+    file part, project fields as a JSON 'data' part or plain form fields) or
+    a raw image body with the project fields in the query string. Uploads
+    are spooled to disk by werkzeug instead of being held in memory.
+    
+    Returns:
+    - (data, plan_source) where plan_source is a base64 string, a binary
+      file object or None
+    """
+    if request.mimetype == 'multipart/form-data':
+        data = json.loads(request.form['data']) if 'data' in request.form else form_fields(request.form)
+        upload = request.files.get('planImage')
+        return data, upload.stream if upload is not None else data.get('planImage')
+    
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        return form_fields(request.args), request.stream
+    
+    data = request.json
+    return data, data.get('planImage')
+
+@bp.route('/api/recommend', methods=['POST'])
 def recommend_providers():
     """Main recommendation endpoint that receives data from frontend"""
     try:
-        data = request.json
-        print(f"\n📥 Received recommendation request:")
-        print(f"   Project: {data.get('name', 'Unnamed')}")
-        print(f"   Location: {data.get('location', 'N/A')}")
-        print(f"   Technologies: {data.get('techNeeds', [])}")
+        data, plan_source = read_recommendation_request()
+        log.info("📥 Received recommendation request", project=data.get('name', 'Unnamed'),
+                 location=data.get('location', 'N/A'), technologies=data.get('techNeeds', []),
+                 plan_image=plan_source is not None)
         
         # Extract project data from frontend
         project_data = {
@@ -328,16 +449,55 @@ def recommend_providers():
             'preferences': data.get('preferences', {}),
         }
         
-        # Analyze construction plan if provided
+        stages = {}
+        
+        engine = data.get('complexityEngine') or COMPLEXITY_ENGINE
+        if engine not in COMPLEXITY_ENGINES:
+            return jsonify({
+                'success': False,
+                'error': f"complexityEngine must be one of: {', '.join(COMPLEXITY_ENGINES)}"
+            }), 400
+        # Without the vision model the local estimate is the only analysis available
+        use_llm = engine != 'local' and recommendation_api.ai_enabled
+        use_local = engine != 'llm'
+        
+        plan_image = None
+        if plan_source and (use_llm or use_local):
+            log.debug("📷 Analyzing construction plan image")
+            # Decode (downscaled) in the request thread: uploads are closed when the request ends
+            try:
+                plan_image = load_plan_image(plan_source)
+            except PlanImageTooLarge:
+                raise
+            except PlanImageError as e:
+                log.warning("⚠️ Error analyzing image", error=str(e))
+        
+        # Start the plan analysis (vision LLM call) in the background; supplier
+        # matching doesn't depend on the complexity score so it runs meanwhile
+        plan_stage = None
+        if plan_image is not None and use_llm:
+            plan_stage = PipelineStage('plan_analysis', PLAN_ANALYSIS_TIMEOUT,
+                                       recommendation_api.assess_construction_plan, plan_image)
+        
+        # Find matching suppliers
+        match_start = time.perf_counter()
+        matching_suppliers = recommendation_api.find_matching_suppliers(project_data)
+        stages['supplier_matching'] = {'status': 'ok', 'ms': round((time.perf_counter() - match_start) * 1000, 1)}
+        
+        # Join the plan analysis; the local estimate covers a missed deadline or
+        # failure (hedge) and requests without the vision model
+        plan_assessment = plan_stage.result(stages) if plan_stage else None
+        complexity_source = 'llm' if plan_assessment else 'default'
+        if not plan_assessment and plan_image is not None and use_local:
+            plan_assessment = recommendation_api.estimate_local_complexity(plan_image, stages)
+            complexity_source = 'local' if plan_assessment else 'default'
+        
         complexity_analysis = None
         complexity_score = 5  # Default medium
-        
-        if data.get('planImage'):
-            print("📷 Analyzing construction plan image...")
-            complexity_analysis = recommendation_api.analyze_construction_plan(data['planImage'])
-            if complexity_analysis:
-                complexity_score = recommendation_api.parse_complexity_score(complexity_analysis)
-                print(f"✅ Complexity score: {complexity_score}/10")
+        if plan_assessment:
+            complexity_analysis, complexity_score = plan_assessment
+            log.info(f"✅ Complexity score: {complexity_score}/10", complexity_score=complexity_score,
+                     complexity_source=complexity_source)
         
         project_data['complexity_score'] = complexity_score
         project_data['complexity_analysis'] = complexity_analysis
@@ -346,32 +506,31 @@ def recommend_providers():
         tech_recommendations = recommendation_api.recommend_tech_based_on_complexity(complexity_score)
         project_data['tech_recommendations'] = tech_recommendations
         
-        # Find matching suppliers
-        print("🔍 Finding matching suppliers...")
-        matching_suppliers = recommendation_api.find_matching_suppliers(project_data)
-        
         if not matching_suppliers:
-            print(f"❌ No suppliers found matching criteria")
+            log.info("❌ No suppliers found matching criteria", technologies=project_data['techNeeds'])
             return jsonify({
                 'success': False,
                 'message': f"No suppliers found with selected technologies: {', '.join(project_data['techNeeds'])}",
                 'tech_recommendations': tech_recommendations[:5],
-                'suggested_technologies': [t['technology'] for t in tech_recommendations[:5]]
+                'suggested_technologies': [t['technology'] for t in tech_recommendations[:5]],
+                'stages': stages
             })
         
-        print(f"✅ Found {len(matching_suppliers)} matching suppliers")
+        log.debug(f"✅ Found {len(matching_suppliers)} matching suppliers", matches=len(matching_suppliers))
         
         # Get top 5 suppliers
         top_suppliers = matching_suppliers[:5]
         
-        # Get AI insights
-        print("💡 Generating AI insights...")
-        ai_insights = recommendation_api.get_ai_insights(project_data, top_suppliers)
+        # Get AI insights (needs the complexity score and top suppliers)
+        insights_stage = PipelineStage('ai_insights', AI_INSIGHTS_TIMEOUT,
+                                       recommendation_api.get_ai_insights, project_data, top_suppliers)
+        ai_insights = insights_stage.result(stages)
         
         response_data = {
             'success': True,
             'project_complexity': complexity_score,
             'complexity_analysis': complexity_analysis,
+            'complexity_source': complexity_source,
             'total_matches': len(matching_suppliers),
             'suppliers': top_suppliers,
             'tech_recommendations': tech_recommendations[:5],
@@ -383,23 +542,31 @@ def recommend_providers():
                 'budget': project_data['budget'],
                 'timeline': project_data['timelineMonths'],
                 'technologies': project_data['techNeeds']
-            }
+            },
+            'stages': stages,
+            'partial': any(stage['status'] != 'ok' for stage in stages.values())
         }
         
-        print(f"✅ Returning {len(top_suppliers)} recommendations")
+        log.info(f"✅ Returning {len(top_suppliers)} recommendations", total_matches=len(matching_suppliers),
+                 partial=response_data['partial'])
         return jsonify(response_data)
         
+    except (PlanImageTooLarge, RequestEntityTooLarge) as e:
+        log.warning("❌ Rejected plan upload", error=str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'The plan image is too large'
+        }), 413
     except Exception as e:
-        print(f"❌ Error in recommend endpoint: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error in recommend endpoint", error=str(e))
         return jsonify({
             'success': False,
             'error': str(e),
             'message': 'An error occurred while processing your request'
         }), 500
 
-@app.route('/api/technologies', methods=['GET'])
+@bp.route('/api/technologies', methods=['GET'])
 def get_technologies():
     """Get list of available technologies"""
     techs = list(recommendation_api.tech_complexity_data.keys())
@@ -409,6 +576,7 @@ def get_technologies():
     })
 
 if __name__ == '__main__':
+    app = create_app()
     print("\n" + "="*60)
     print("🚀 RAWASI Provider Recommendation API")
     print("="*60)
@@ -0,0 +1,36 @@
+"""
+RAWASI SQLite Tier
+Fork-safe SQLite connection shared by the recommendation disk caches
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class SQLiteTier:
+    """
+    Per-process SQLite connection shared by the service's disk caches
+
+    Connections are opened lazily and re-opened after a fork, so a cache
+    created in a preloading master is safe to use from its workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+
+    def _setup(self, conn):
+        """Create tables for a new connection (overridden by subclasses)"""
+
+    def connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._setup(conn)
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
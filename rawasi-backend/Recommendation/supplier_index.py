@@ -0,0 +1,166 @@
+"""
+RAWASI Supplier Index
+Inverted index over suppliers by technology and region for fast matching
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from location_index import locations
+from techniques import KeywordAutomaton
+
+# Maximum memoized query needles / locations (least recently used are dropped)
+MEMO_LIMIT = 4096
+
+
+def _group_ids(values):
+    """Map each distinct value to the array of row ids holding it"""
+    distinct, inverse = np.unique(values, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(distinct)))[:-1]
+    return dict(zip(distinct.tolist(), np.split(order, bounds)))
+
+
+class SupplierIndex:
+    """
+    Precomputed lookup structures for find_matching_suppliers
+
+    Technology matching is substring based (e.g. the needle "precast"
+    matches the supplier technology "Precast Concrete"), so suppliers are
+    grouped by their distinct lowercased technology and region strings.
+    Every technology name and alias in tech_complexity_data is compiled
+    into one KeywordAutomaton, each distinct supplier technology is scanned
+    once at load, and each known technology gets a precomputed mask
+    covering its name and aliases. Other needles are tested once per
+    distinct string and memoized in a thread-safe LRU cache.
+
+    Regions are matched by zone through the shared location index: each
+    distinct supplier region ("Central", "Eastern / Central", "Jeddah") is
+    resolved to its zones once at load, so a project in Riyadh or Al Kharj
+    matches Central suppliers. Text containment still counts, for regions
+    the gazetteer doesn't know.
+    """
+
+    def __init__(self, store, tech_complexity_data):
+        self.store = store
+        self.tech_complexity_data = tech_complexity_data
+        self.size = len(store)
+        self._tech_groups = _group_ids(store.column('tech_lower'))
+        self._region_groups = _group_ids(store.column('region_lower'))
+
+        # An 'all' region matches any location (and an empty one is contained in any)
+        region_lower = store.column('region_lower')
+        self._always_region = (np.char.find(region_lower, 'all') >= 0) | (region_lower == '')
+
+        # Zone -> mask of suppliers whose preferred region lies in or covers it
+        self._zone_masks = {zone: np.zeros(self.size, dtype=bool) for zone in locations.zone_names}
+        for region, ids in self._region_groups.items():
+            for zone in locations.zones_in(region):
+                self._zone_masks[zone][ids] = True
+
+        # Rating bonus is fixed per supplier: (rating - 3.0) * 10, or 0 if unrated
+        ratings = np.asarray(store.column('rating'), dtype=float)
+        self._rated = ~np.isnan(ratings)
+        self._rating_bonus = np.where(self._rated, (ratings - 3.0) * 10, 0.0)
+
+        # Masks for other needles and for locations, shared by request threads
+        self._scan_needle = lru_cache(maxsize=MEMO_LIMIT)(self._scan_needle)
+        self.region_mask = lru_cache(maxsize=MEMO_LIMIT)(self.region_mask)
+
+        # One automaton pass per distinct supplier technology finds every known needle in it
+        automaton = KeywordAutomaton(
+            needle for tech_name, tech_data in tech_complexity_data.items()
+            for needle in [tech_name] + list(tech_data.get('alias', []))
+        )
+        self._known_masks = {needle: np.zeros(self.size, dtype=bool) for needle in automaton.keywords}
+        for tech_lower, ids in self._tech_groups.items():
+            for needle in automaton.find(tech_lower):
+                self._known_masks[needle][ids] = True
+
+        # Requested technology -> mask over its name and aliases
+        self._tech_memo = {}
+        for tech_name, tech_data in tech_complexity_data.items():
+            mask = self.tech_mask(tech_name.lower())
+            for alias in tech_data.get('alias', []):
+                mask = mask | self.tech_mask(alias.lower())
+            self._tech_memo[tech_name] = mask
+
+    def tech_mask(self, needle):
+        """Boolean mask of suppliers whose technology contains needle (shared; don't modify)"""
+        mask = self._known_masks.get(needle)
+        return mask if mask is not None else self._scan_needle(needle)
+
+    def _scan_needle(self, needle):
+        mask = np.zeros(self.size, dtype=bool)
+        for tech_lower, ids in self._tech_groups.items():
+            if needle in tech_lower:
+                mask[ids] = True
+        return mask
+
+    def region_mask(self, location_lower):
+        """Boolean mask of suppliers whose preferred region shares a zone with or names location"""
+        mask = self._always_region.copy()
+        for zone in locations.zones_in(location_lower):
+            mask |= self._zone_masks[zone]
+        for region_lower, ids in self._region_groups.items():
+            if location_lower in region_lower or region_lower in location_lower:
+                mask[ids] = True
+        return mask
+
+    def match(self, target_location, target_techs):
+        """
+        Score suppliers for a location and list of technologies
+
+        Only technology matches are included, each tagged with the first
+        requested technology (or one of its aliases) it matched, in the
+        original scan's order (score descending, then file order).
+        """
+        # Index of the first requested technology each supplier matches (-1 = none)
+        matched_index = np.full(self.size, -1)
+        for position, tech in enumerate(target_techs):
+            mask = self._tech_memo.get(tech)
+            if mask is None:
+                mask = self.tech_mask(tech.lower())
+            matched_index[mask & (matched_index == -1)] = position
+
+        candidates = np.flatnonzero(matched_index >= 0)
+        if len(candidates) == 0:
+            return []
+
+        region_match = self.region_mask(target_location.lower())[candidates]
+        scores = np.where(region_match, 50.0, 0.0) + 50.0 + self._rating_bonus[candidates]
+        # Unrated suppliers keep integer scores (50/100), as in the original scan
+        rounded = [round(score, 1) if rated else int(score)
+                   for score, rated in zip(scores.tolist(), self._rated[candidates].tolist())]
+
+        # Stable sort by score, descending, keeps file order among ties
+        order = np.argsort(-np.array(rounded), kind='stable')
+
+        matching_suppliers = []
+        for i in order.tolist():
+            supplier_id = candidates[i]
+            supplier = self.store.row(supplier_id)
+            is_region_match = bool(region_match[i])
+
+            match_reasons = []
+            if is_region_match:
+                match_reasons.append("Region match")
+            match_reasons.append("Technology expertise")
+
+            matching_suppliers.append({
+                'name': supplier['name'],
+                'alliance': supplier['alliance'],
+                'region': supplier['region'],
+                'technology': supplier['technology'],
+                'rating': supplier['rating'] if self._rated[supplier_id] else 'N/A',
+                'contact': supplier['contact'],
+                'email': supplier['email'],
+                'phone': supplier['phone'],
+                'match_score': rounded[i],
+                'match_reasons': match_reasons,
+                'region_match': is_region_match,
+                'tech_match': True,
+                'matched_technology': target_techs[matched_index[supplier_id]]
+            })
+        return matching_suppliers
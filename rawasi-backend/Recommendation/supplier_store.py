@@ -0,0 +1,156 @@
+"""
+RAWASI Supplier Store
+Columnar supplier table normalized once at load, with a memory-mapped cache
+"""
+
+import json
+import os
+
+import numpy as np
+
+from instrumentation import get_logger
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = get_logger('supplier_store')
+
+# Directory for the serialized table; rebuilt whenever the JSON file changes
+CACHE_DIR = os.getenv('SUPPLIER_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+
+# Bump when the column layout changes so stale caches are ignored
+STORE_VERSION = 1
+
+# Text columns: name -> (JSON keys tried in order, default when missing)
+TEXT_COLUMNS = {
+    'name': (('Contractor_Name', 'Factory_Name'), ''),
+    'technology': (('Building_Tech_Type', 'Tech_Type'), ''),
+    'region': (('Preferred_Region',), ''),
+    'alliance': (('Alliance_Company_Name',), 'N/A'),
+    'contact': (('Contact_Person',), 'N/A'),
+    'email': (('Email',), 'N/A'),
+    'phone': (('Mobile_Number',), 'N/A'),
+}
+
+# Normalized lookup columns derived from the text columns
+LOWER_COLUMNS = {'tech_lower': 'technology', 'region_lower': 'region'}
+
+
+def _text(record, keys, default):
+    """Column value: first truthy of several keys, or a plain .get for one key"""
+    if len(keys) > 1:
+        value = next((record[key] for key in keys if record.get(key)), default)
+    else:
+        value = record.get(keys[0], default)
+    return '' if value is None else str(value)
+
+
+class SupplierStore:
+    """
+    Suppliers as one NumPy structured array (one row per supplier)
+
+    Only suppliers that can ever be matched (with a name and a technology)
+    are kept. Text columns are fixed-width unicode and the rating is a
+    float with NaN for missing or non-numeric scores, so the table can be
+    saved as a plain .npy file and memory-mapped: workers open it without
+    parsing JSON and share its pages through the OS page cache.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def column(self, name):
+        """Full column as an array (a view for memory-mapped tables)"""
+        return self.table[name]
+
+    def row(self, supplier_id):
+        """One supplier as a dict of plain Python values"""
+        return dict(zip(self.table.dtype.names, self.table[supplier_id].item()))
+
+    @classmethod
+    def from_records(cls, records):
+        """Normalize a list of supplier dicts as read from the JSON file"""
+        columns = {name: [] for name in TEXT_COLUMNS}
+        ratings = []
+
+        for record in records:
+            values = {column: _text(record, keys, default)
+                      for column, (keys, default) in TEXT_COLUMNS.items()}
+            if not values['name'] or not values['technology']:
+                continue
+
+            for column, value in values.items():
+                columns[column].append(value)
+
+            score = record.get('totalScore')
+            is_number = isinstance(score, (int, float)) and not isinstance(score, bool)
+            ratings.append(float(score) if is_number else np.nan)
+
+        for column, source in LOWER_COLUMNS.items():
+            columns[column] = [value.lower() for value in columns[source]]
+
+        # Fixed-width unicode columns sized to the longest value (at least 1)
+        dtype = [(column, f'U{max([len(v) for v in values] + [1])}')
+                 for column, values in columns.items()]
+        dtype.append(('rating', 'f8'))
+
+        table = np.empty(len(ratings), dtype=dtype)
+        for column, values in columns.items():
+            table[column] = values
+        table['rating'] = ratings
+        return cls(table)
+
+    @classmethod
+    def load(cls, json_path, cache_dir=CACHE_DIR):
+        """
+        Load the store for json_path, using the cached table when fresh
+
+        Parameters:
+        - json_path: suppliers JSON file
+        - cache_dir: directory for the .npy cache (None disables caching)
+
+        Returns:
+        - SupplierStore (memory-mapped when served from the cache)
+        """
+        cache_path = None
+        if cache_dir:
+            stat = os.stat(json_path)
+            stem = os.path.splitext(os.path.basename(json_path))[0].replace(' ', '_')
+            cache_path = os.path.join(
+                cache_dir, f"{stem}.v{STORE_VERSION}.{stat.st_size}.{stat.st_mtime_ns}.npy"
+            )
+            if os.path.exists(cache_path):
+                try:
+                    return cls(np.load(cache_path, mmap_mode='r', allow_pickle=False))
+                except (OSError, ValueError) as e:
+                    log.warning("⚠️ Ignoring unreadable supplier cache", path=cache_path, error=str(e))
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            store = cls.from_records(json.load(f))
+
+        if cache_path:
+            try:
+                store.save(cache_path)
+            except OSError as e:
+                log.warning("⚠️ Could not write supplier cache", path=cache_path, error=str(e))
+        return store
+
+    def save(self, path):
+        """Write the table atomically and drop older caches of the same file"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.table), allow_pickle=False)
+        os.replace(tmp_path, path)
+
+        prefix = os.path.basename(path).split('.v', 1)[0] + '.v'
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith('.npy') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
@@ -3,35 +3,104 @@ RAWASI Timeline Prediction API
 Flask wrapper for the construction timeline prediction model
 """
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
-import google.generativeai as genai
+import numpy as np
+import math
 import re
 import os
+import sys
+import threading
+import time
+import uuid
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
 
+# Shared backend modules (ttl_cache, ...) live one directory up. gunicorn.conf.py
+# and gateway.py put them on the path; this covers running the file directly.
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrumentation import get_logger, instrument_app, run_in_context
+from llm_gateway import gateway as llm_gateway
+from techniques import TechniqueClassifier
+from ttl_cache import SingleFlight, TTLCache
+
 # Load environment variables
 load_dotenv('.env')
 
-app = Flask(__name__)
-CORS(app)
+bp = Blueprint('timeline', __name__)
+log = get_logger('timeline')
+
+# AI prediction cache; areas within the same bucket share an entry
+TIMELINE_CACHE_SIZE = int(os.getenv('TIMELINE_CACHE_SIZE', 2048))
+TIMELINE_CACHE_TTL = float(os.getenv('TIMELINE_CACHE_TTL', 6 * 3600))
+TIMELINE_AREA_BUCKET_SQM = float(os.getenv('TIMELINE_AREA_BUCKET_SQM', 50))
+
+# Per-attempt timeout for the (slow) pro model
+TIMELINE_LLM_TIMEOUT = float(os.getenv('TIMELINE_LLM_TIMEOUT', 60))
+
+# Hedged mode: if the AI hasn't answered within this many seconds, return the
+# rule-based estimate with a job id and let the AI call finish in the
+# background (0 disables; requests can set deadlineMs)
+TIMELINE_HEDGE_DEADLINE = float(os.getenv('TIMELINE_HEDGE_DEADLINE', 0))
+TIMELINE_JOB_TTL = float(os.getenv('TIMELINE_JOB_TTL', 600))
+TIMELINE_MAX_JOBS = int(os.getenv('TIMELINE_MAX_JOBS', 10000))
+
+# Longest a job poll may block with ?wait=
+MAX_JOB_WAIT_SECONDS = 30
+
+# Largest number of rows (projects, or grid combinations) per batch request
+TIMELINE_BATCH_MAX_ROWS = int(os.getenv('TIMELINE_BATCH_MAX_ROWS', 1_000_000))
+
+# Base efficiency factors (months per 1000 sqm) for technique categories
+EFFICIENCY_FACTORS = {
+    # High efficiency - prefabricated systems
+    'precast': 0.22,  # Precast, ALC, 3D panels, Modular systems
+    # Medium-high efficiency - rapid formwork
+    'formwork': 0.25,  # Tunnel form, ICF, Permanent formwork
+    # Medium efficiency - lightweight systems
+    'lightweight': 0.28,  # Lightweight concrete, Aerated concrete
+    # Standard modern efficiency
+    'standard': 0.30   # Other modern techniques
+}
+
+# Category keywords, checked in this order (the most efficient category wins)
+CATEGORY_KEYWORDS = (
+    ('precast', ('precast', 'alc', '3d concrete', 'modular', 'sandwich panels', 'waffle-crete')),
+    ('formwork', ('tunnel form', 'tunnel formwork', 'icf', 'insulated concrete form', 'permanent formwork')),
+    ('lightweight', ('lightweight', 'aerated', 'eps', 'foam concrete')),
+)
+CATEGORY_CLASSIFIER = TechniqueClassifier(dict(CATEGORY_KEYWORDS))
+
+@lru_cache(maxsize=4096)
+def technique_category(techniques):
+    """Most efficient technique category for a tuple of technique names"""
+    # Keywords may span two names (e.g. "Tunnel" + "Form"), so the joined text is classified
+    joined = ' '.join(tech.lower() for tech in techniques)
+    return CATEGORY_CLASSIFIER.first(joined, default='standard')
+
+# Threads for AI predictions running behind a hedge
+timeline_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('TIMELINE_WORKERS', 8)),
+    thread_name_prefix='timeline'
+)
 
 class ModernConstructionTimePredictor:
     def __init__(self):
         """Initialize the Gemini AI predictor for modern construction"""
-        api_key = os.getenv('GEMINI_API_KEY')
-        
-        if api_key:
+        if llm_gateway.enabled:
             try:
-                genai.configure(api_key=api_key)
-                self.model = genai.GenerativeModel('gemini-2.5-pro')
+                # Calls go through the shared gateway (concurrency cap, timeouts, retries, breaker)
+                self.model = llm_gateway.client('gemini-2.5-pro', timeout=TIMELINE_LLM_TIMEOUT)
                 self.ai_enabled = True
-                print(f"✅ AI enabled for timeline prediction")
+                log.info("✅ AI enabled for timeline prediction")
             except Exception as e:
-                print(f"⚠️ AI initialization failed: {e}")
+                log.warning("⚠️ AI initialization failed", error=str(e))
                 self.ai_enabled = False
         else:
-            print("⚠️ No API key - using fallback estimation")
+            log.warning("⚠️ No API key - using fallback estimation")
             self.ai_enabled = False
         
         # Modern construction constraints
@@ -63,6 +132,15 @@ class ModernConstructionTimePredictor:
             "Waffle-Crete building system (precast concrete panels for wall & slab)"
         ]
         
+        # Memoized AI predictions, with identical in-flight requests coalesced
+        self.prediction_cache = TTLCache(maxsize=TIMELINE_CACHE_SIZE, ttl=TIMELINE_CACHE_TTL)
+        self.prediction_flights = SingleFlight()
+        self._metrics_lock = threading.Lock()
+        self.saved_seconds = 0.0
+        
+        # Background AI predictions started by hedged requests (job id -> Future)
+        self.jobs = TTLCache(maxsize=TIMELINE_MAX_JOBS, ttl=TIMELINE_JOB_TTL)
+        
     def extract_numeric_value(self, text):
         """Extract numeric value from AI response"""
         numbers = re.findall(r'\d+\.?\d*', text)
@@ -72,17 +150,145 @@ class ModernConstructionTimePredictor:
         """Ensure prediction is within reasonable bounds"""
         return max(self.min_time, min(self.max_time, months))
     
+    def canonical_area(self, area_sqm):
+        """Snap area to the cache bucket so near-identical inputs share an entry"""
+        if TIMELINE_AREA_BUCKET_SQM <= 0:
+            return area_sqm
+        return max(TIMELINE_AREA_BUCKET_SQM, round(area_sqm / TIMELINE_AREA_BUCKET_SQM) * TIMELINE_AREA_BUCKET_SQM)
+    
+    def prediction_key(self, area_sqm, num_floors, complexity, techniques):
+        """Cache key: area bucket, floors, complexity and the (unordered) technique set"""
+        technique_set = tuple(sorted({tech.strip().lower() for tech in techniques}))
+        return (self.canonical_area(area_sqm), num_floors, complexity, technique_set)
+    
     def predict_construction_time(self, area_sqm, num_floors, complexity=3, selected_techniques=None):
         """
         Predict construction time using modern techniques
         
+        AI predictions are memoized per prediction_key and computed for the
+        bucketed area; concurrent identical requests share one model call.
+        Rule-based fallbacks are never shared: each caller's is computed
+        for its own area.
+        
         Args:
             area_sqm (float): Total area in square meters
             num_floors (int): Number of floors
             complexity (int): 1-5 (1=simple, 5=complex)
             selected_techniques (list): List of selected construction techniques
         """
+        if not self.ai_enabled:
+            return self.compute_construction_time(area_sqm, num_floors, complexity, selected_techniques)
+        
+        techniques = selected_techniques or self.all_techniques
+        key = self.prediction_key(area_sqm, num_floors, complexity, techniques)
+        entry = self.prediction_cache.get(key)
+        cache_status = 'hit'
+        if entry is None:
+            entry = self.prediction_flights.do(key, self._compute_entry, key, area_sqm, num_floors, complexity, techniques)
+            cache_status = 'miss'
+        else:
+            with self._metrics_lock:
+                self.saved_seconds += entry['seconds']
         
+        result = dict(entry['result'])
+        if result.get('method') != 'ai':
+            # The flight may have been led by another area in the same bucket
+            predicted_months = self.modern_fallback_estimation(area_sqm, num_floors, complexity, techniques)
+            result['predicted_months'] = round(predicted_months, 1)
+        result.update({
+            'area_sqm': area_sqm,
+            'techniques_used': techniques,
+            'cache': cache_status
+        })
+        return result
+    
+    def predict_hedged(self, area_sqm, num_floors, complexity=3, selected_techniques=None, deadline=TIMELINE_HEDGE_DEADLINE):
+        """
+        Predict with a deadline on the AI answer
+        
+        Waits up to deadline seconds for predict_construction_time. If the AI
+        is slower, returns the rule-based estimate immediately with
+        method 'fallback' and a job_id; the AI prediction keeps running and
+        can be fetched with get_job (and lands in the prediction cache).
+        Jobs live in this process only.
+        """
+        if not self.ai_enabled or deadline <= 0:
+            return self.predict_construction_time(area_sqm, num_floors, complexity, selected_techniques)
+        
+        future = run_in_context(
+            timeline_executor, self.predict_construction_time, area_sqm, num_floors, complexity, selected_techniques
+        )
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout:
+            pass
+        
+        job_id = uuid.uuid4().hex
+        self.jobs.set(job_id, future)
+        
+        techniques = selected_techniques or self.all_techniques
+        predicted_months = self.modern_fallback_estimation(area_sqm, num_floors, complexity, techniques)
+        return {
+            'success': True,
+            'area_sqm': area_sqm,
+            'num_floors': num_floors,
+            'complexity': complexity,
+            'predicted_months': round(predicted_months, 1),
+            'techniques_used': techniques,
+            'method': 'fallback',
+            'job_id': job_id,
+            'job_status': 'pending'
+        }
+    
+    def get_job(self, job_id, wait=0):
+        """
+        Status of a hedged AI prediction
+        
+        Returns:
+        - None for unknown/expired jobs, else a dict with status
+          ('pending', 'done' or 'error') and the result when done
+        """
+        future = self.jobs.get(job_id)
+        if future is None:
+            return None
+        
+        try:
+            result = future.result(timeout=wait) if wait > 0 else (future.result() if future.done() else None)
+        except FutureTimeout:
+            result = None
+        except Exception as e:
+            return {'job_id': job_id, 'status': 'error', 'error': str(e)}
+        
+        if result is None:
+            return {'job_id': job_id, 'status': 'pending'}
+        return {'job_id': job_id, 'status': 'done', 'result': result}
+    
+    def _compute_entry(self, key, area_sqm, num_floors, complexity, techniques):
+        """Run the prediction for a cache key, storing successful AI answers"""
+        start = time.perf_counter()
+        result = self.compute_construction_time(area_sqm, num_floors, complexity, techniques, prompt_area_sqm=key[0])
+        entry = {'result': result, 'seconds': time.perf_counter() - start}
+        # Fallbacks after a failed or unparseable AI call are not cached
+        if result.get('method') == 'ai':
+            self.prediction_cache.set(key, entry)
+        return entry
+    
+    def cache_stats(self):
+        """Prediction cache counters for the health endpoint"""
+        stats = self.prediction_cache.stats()
+        stats['area_bucket_sqm'] = TIMELINE_AREA_BUCKET_SQM
+        stats['saved_seconds'] = round(self.saved_seconds, 3)
+        stats['single_flight'] = self.prediction_flights.stats()
+        return stats
+    
+    def compute_construction_time(self, area_sqm, num_floors, complexity=3, selected_techniques=None,
+                                  prompt_area_sqm=None):
+        """
+        Uncached prediction (AI when enabled, rule-based otherwise)
+        
+        prompt_area_sqm is the area sent to the AI (the cache bucket, so the
+        answer can be shared); rule-based estimates always use area_sqm.
+        """
         if selected_techniques is None or len(selected_techniques) == 0:
             selected_techniques = self.all_techniques
         
@@ -106,7 +312,7 @@ class ModernConstructionTimePredictor:
         As an expert in modern construction technologies, estimate the construction timeline using these specific techniques:
         
         Project Details:
-        - Total Area: {area_sqm} square meters
+        - Total Area: {prompt_area_sqm or area_sqm} square meters
         - Number of Floors: {num_floors}
         - Complexity Level: {complexity}/5
         
@@ -153,7 +359,7 @@ class ModernConstructionTimePredictor:
             }
             
         except Exception as e:
-            print(f"⚠️ AI prediction failed: {e}")
+            log.warning("⚠️ AI prediction failed", error=str(e))
             # Fallback to modern estimation
             predicted_months = self.modern_fallback_estimation(area_sqm, num_floors, complexity, selected_techniques)
             
@@ -171,34 +377,8 @@ class ModernConstructionTimePredictor:
     def modern_fallback_estimation(self, area_sqm, num_floors, complexity, techniques):
         """Modern construction estimation with specific techniques"""
         
-        # Base efficiency factors for different technique categories
-        efficiency_factors = {
-            # High efficiency - prefabricated systems
-            'precast': 0.22,  # Precast, ALC, 3D panels, Modular systems
-            # Medium-high efficiency - rapid formwork
-            'formwork': 0.25,  # Tunnel form, ICF, Permanent formwork
-            # Medium efficiency - lightweight systems
-            'lightweight': 0.28,  # Lightweight concrete, Aerated concrete
-            # Standard modern efficiency
-            'standard': 0.30   # Other modern techniques
-        }
-        
         # Determine the most efficient technique category being used
-        base_rate = efficiency_factors['standard']  # Default
-        
-        # Check for high efficiency techniques
-        precast_keywords = ['precast', 'alc', '3d concrete', 'modular', 'sandwich panels', 'waffle-crete']
-        formwork_keywords = ['tunnel form', 'tunnel formwork', 'icf', 'insulated concrete form', 'permanent formwork']
-        lightweight_keywords = ['lightweight', 'aerated', 'eps', 'foam concrete']
-        
-        techniques_lower = [tech.lower() for tech in techniques]
-        
-        if any(keyword in ' '.join(techniques_lower) for keyword in precast_keywords):
-            base_rate = efficiency_factors['precast']
-        elif any(keyword in ' '.join(techniques_lower) for keyword in formwork_keywords):
-            base_rate = efficiency_factors['formwork']
-        elif any(keyword in ' '.join(techniques_lower) for keyword in lightweight_keywords):
-            base_rate = efficiency_factors['lightweight']
+        base_rate = EFFICIENCY_FACTORS[technique_category(tuple(techniques))]
         
         # Complexity impact (1-5 scale)
         complexity_multiplier = 0.85 + (complexity * 0.06)
@@ -221,62 +401,306 @@ class ModernConstructionTimePredictor:
         
         # Apply constraints
         return self.validate_time(adjusted_time)
+    
+    def modern_fallback_estimation_batch(self, area_sqm, num_floors, complexity, technique_sets, set_ids):
+        """
+        Vectorized modern_fallback_estimation
+        
+        Performs the same floating-point operations in the same order as
+        the scalar version, so every value is bit-for-bit identical.
+        
+        Args:
+            area_sqm, num_floors, complexity: equal-length sequences
+            technique_sets (list): distinct technique lists
+            set_ids: index into technique_sets for every row
+        
+        Returns:
+            np.ndarray of float64 months (before rounding)
+        """
+        area_sqm = np.asarray(area_sqm, dtype=np.float64)
+        num_floors = np.asarray(num_floors)
+        complexity = np.asarray(complexity, dtype=np.float64)
+        
+        # Category (and base rate) resolved once per distinct technique set
+        set_rates = np.array([EFFICIENCY_FACTORS[technique_category(tuple(techniques))]
+                              for techniques in technique_sets], dtype=np.float64)
+        base_rate = set_rates[np.asarray(set_ids, dtype=np.intp)]
+        
+        complexity_multiplier = 0.85 + (complexity * 0.06)
+        floor_multiplier = np.select(
+            [num_floors <= 5, num_floors <= 15, num_floors <= 30],
+            [1.0, 1.02, 1.05],
+            default=1.12
+        )
+        
+        base_time = (area_sqm / 1000) * base_rate
+        adjusted_time = base_time * complexity_multiplier * floor_multiplier
+        return np.clip(adjusted_time, self.min_time, self.max_time)
+    
+    def predict_batch_fallback(self, area_sqm, num_floors, complexity, technique_sets, set_ids):
+        """
+        Rule-based predictions for many rows, rounded like predict_construction_time
+        
+        Returns:
+            list of predicted months; clipped rows are the int bounds, as
+            validate_time returns them
+        """
+        months = self.modern_fallback_estimation_batch(area_sqm, num_floors, complexity, technique_sets, set_ids)
+        rounded = [round(value, 1) for value in months.tolist()]
+        for index in np.flatnonzero(months <= self.min_time).tolist():
+            rounded[index] = self.min_time
+        for index in np.flatnonzero(months >= self.max_time).tolist():
+            rounded[index] = self.max_time
+        return rounded
 
-# Initialize predictor
-predictor = ModernConstructionTimePredictor()
+# Initialized by create_app() so the predictor is built once per process tree
+predictor = None
+
+def init_service():
+    """
+    Build the predictor once
+    
+    Returns:
+    - List of hooks to run in each forked worker (none needed)
+    """
+    global predictor
+    if predictor is None:
+        predictor = ModernConstructionTimePredictor()
+    return []
+
+def create_app():
+    """
+    Application factory
+    
+    Builds the predictor once. Under gunicorn with preload_app (see
+    gunicorn.conf.py) this runs in the master and workers inherit it.
+    
+    Usage: gunicorn -c gunicorn.conf.py -b 0.0.0.0:5002 --chdir Timeline 'Time:create_app()'
+    """
+    post_fork = init_service()
+    
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(bp)
+    instrument_app(app)
+    app.extensions['post_fork'] = post_fork
+    return app
 
 # ==================== API ENDPOINTS ====================
 
-@app.route('/api/health', methods=['GET'])
+def parse_area(value):
+    """sizeSqm as a float; NaN, infinite or non-positive areas are rejected"""
+    area_sqm = float(value)
+    if not (math.isfinite(area_sqm) and area_sqm > 0):
+        raise ValueError("sizeSqm must be a positive number")
+    return area_sqm
+
+@bp.route('/api/health', methods=['GET'])
 def health_check():
     """Health check"""
     return jsonify({
         'status': 'healthy',
         'ai_enabled': predictor.ai_enabled,
-        'service': 'timeline_prediction'
+        'service': 'timeline_prediction',
+        'prediction_cache': predictor.cache_stats(),
+        'hedge_jobs': len(predictor.jobs),
+        'llm': llm_gateway.stats()
     })
 
-@app.route('/api/predict-timeline', methods=['POST'])
+@bp.route('/api/predict-timeline', methods=['POST'])
 def predict_timeline():
     """Predict construction timeline"""
     try:
         data = request.json
         
         # Extract parameters
-        area_sqm = float(data.get('sizeSqm', 1500))
+        try:
+            area_sqm = parse_area(data.get('sizeSqm', 1500))
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         num_floors = int(data.get('Nfloors', 2))
         complexity = int(data.get('complexity', 3))
         tech_needs = data.get('techNeeds', [])
+        deadline = float(data['deadlineMs']) / 1000 if data.get('deadlineMs') is not None else TIMELINE_HEDGE_DEADLINE
         
-        print(f"\n📥 Timeline Request:")
-        print(f"   Area: {area_sqm} sqm")
-        print(f"   Floors: {num_floors}")
-        print(f"   Complexity: {complexity}/5")
-        print(f"   Technologies: {tech_needs}")
+        log.info("📥 Timeline request", area_sqm=area_sqm, floors=num_floors,
+                 complexity=complexity, technologies=tech_needs)
         
         # Get prediction
-        result = predictor.predict_construction_time(
+        result = predictor.predict_hedged(
             area_sqm=area_sqm,
             num_floors=num_floors,
             complexity=complexity,
-            selected_techniques=tech_needs if tech_needs else None
+            selected_techniques=tech_needs if tech_needs else None,
+            deadline=deadline
         )
         
-        print(f"✅ Predicted timeline: {result['predicted_months']} months ({result['method']})")
+        log.info(f"✅ Predicted timeline: {result['predicted_months']} months",
+                 predicted_months=result['predicted_months'], method=result['method'],
+                 cache=result.get('cache'), job_id=result.get('job_id'))
         
         return jsonify(result)
         
     except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Error in timeline endpoint", error=str(e))
         return jsonify({
             'success': False,
             'error': str(e),
             'message': 'Failed to predict timeline'
         }), 500
 
+def technique_set_ids(technique_lists):
+    """Distinct technique lists (empty -> all techniques) and each row's index into them"""
+    technique_sets = []
+    set_index = {}
+    set_ids = []
+    for techniques in technique_lists:
+        key = tuple(techniques) if techniques else tuple(predictor.all_techniques)
+        if key not in set_index:
+            set_index[key] = len(technique_sets)
+            technique_sets.append(list(key))
+        set_ids.append(set_index[key])
+    return technique_sets, set_ids
+
+def batch_projects(projects):
+    """Validate project rows and predict them in one vectorized pass"""
+    results = [None] * len(projects)
+    rows = []
+    for index, project in enumerate(projects):
+        try:
+            if not isinstance(project, dict):
+                raise ValueError("Project must be a JSON object")
+            tech_needs = project.get('techNeeds') or []
+            if not isinstance(tech_needs, list):
+                raise ValueError("techNeeds must be a list")
+            rows.append((index, parse_area(project.get('sizeSqm', 1500)), int(project.get('Nfloors', 2)),
+                         int(project.get('complexity', 3)), tech_needs))
+        except (TypeError, ValueError) as e:
+            results[index] = {'success': False, 'index': index, 'error': str(e)}
+    
+    if rows:
+        indices, areas, floors, complexities, tech_lists = zip(*rows)
+        technique_sets, set_ids = technique_set_ids(tech_lists)
+        months = predictor.predict_batch_fallback(areas, floors, complexities, technique_sets, set_ids)
+        for index, area, floor_count, complexity, set_id, predicted in zip(
+                indices, areas, floors, complexities, set_ids, months):
+            results[index] = {
+                'success': True,
+                'index': index,
+                'area_sqm': area,
+                'num_floors': floor_count,
+                'complexity': complexity,
+                'predicted_months': predicted,
+                'techniques_used': technique_sets[set_id],
+                'method': 'fallback'
+            }
+    return results
+
+def batch_grid(grid):
+    """Predict every (area, floors, complexity, techniques) combination of a grid"""
+    areas = [parse_area(v) for v in grid.get('sizeSqm', [1500])]
+    floors = [int(v) for v in grid.get('Nfloors', [2])]
+    complexities = [int(v) for v in grid.get('complexity', [3])]
+    tech_lists = grid.get('techNeeds') or [[]]
+    if not all(isinstance(techniques, list) for techniques in tech_lists):
+        raise ValueError("grid techNeeds must be a list of technique lists")
+    technique_sets, set_ids = technique_set_ids(tech_lists)
+    
+    shape = (len(areas), len(floors), len(complexities), len(set_ids))
+    count = int(np.prod(shape))
+    if count == 0:
+        raise ValueError("Every grid axis needs at least one value")
+    if count > TIMELINE_BATCH_MAX_ROWS:
+        raise ValueError(f"Grid has {count} combinations; the limit is {TIMELINE_BATCH_MAX_ROWS}")
+    
+    # Row-major order: area varies slowest, technique set fastest
+    axes = np.meshgrid(np.array(areas), np.array(floors), np.array(complexities),
+                       np.array(set_ids, dtype=np.intp), indexing='ij')
+    area_col, floor_col, complexity_col, set_col = (axis.ravel() for axis in axes)
+    months = predictor.predict_batch_fallback(area_col, floor_col, complexity_col, technique_sets, set_col)
+    return {
+        'count': count,
+        'shape': list(shape),
+        'technique_sets': technique_sets,
+        'columns': {
+            'area_sqm': area_col.tolist(),
+            'num_floors': floor_col.tolist(),
+            'complexity': complexity_col.tolist(),
+            'technique_set': set_col.tolist(),
+            'predicted_months': months
+        },
+        'method': 'fallback'
+    }
+
+@bp.route('/api/predict-timeline/batch', methods=['POST'])
+def predict_timeline_batch():
+    """
+    Rule-based timeline predictions for many projects or a scenario grid
+    
+    Expected JSON body, either a list of projects:
+    {
+        "projects": [
+            {"sizeSqm": 1500, "Nfloors": 2, "complexity": 3, "techNeeds": ["Precast"]},
+            ...
+        ]
+    }
+    or a grid whose every combination is priced (results are columnar):
+    {
+        "grid": {
+            "sizeSqm": [500, 1000, 1500],
+            "Nfloors": [1, 2, 3],
+            "complexity": [1, 3, 5],
+            "techNeeds": [["Precast"], ["Tunnel Form"]]
+        }
+    }
+    Predictions use modern_fallback_estimation (vectorized) and match
+    /api/predict-timeline without AI exactly.
+    """
+    try:
+        data = request.get_json()
+        
+        if data.get('grid'):
+            start = time.perf_counter()
+            result = batch_grid(data['grid'])
+            log.info(f"✅ Timeline grid: {result['count']} combinations", combinations=result['count'],
+                     ms=round((time.perf_counter() - start) * 1000, 1))
+            return jsonify(dict(result, success=True))
+        
+        projects = data.get('projects', [])
+        if not projects:
+            return jsonify({'success': False, 'error': 'No projects or grid provided'}), 400
+        if len(projects) > TIMELINE_BATCH_MAX_ROWS:
+            return jsonify({'success': False, 'error': f"At most {TIMELINE_BATCH_MAX_ROWS} projects per request"}), 400
+        
+        return jsonify({'success': True, 'count': len(projects), 'predictions': batch_projects(projects)})
+        
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        log.exception("❌ Error in timeline batch endpoint", error=str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to predict timelines'
+        }), 500
+
+@bp.route('/api/predict-timeline/jobs/<job_id>', methods=['GET'])
+def timeline_job(job_id):
+    """Fetch (or long-poll with ?wait=seconds) a hedged AI prediction"""
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_JOB_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'wait must be a number of seconds'}), 400
+    
+    job = predictor.get_job(job_id, wait)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job', 'job_id': job_id}), 404
+    
+    job['success'] = job['status'] != 'error'
+    return jsonify(job), 202 if job['status'] == 'pending' else 200
+
 if __name__ == '__main__':
+    app = create_app()
     print("\n" + "="*70)
     print("🚀 RAWASI Timeline Prediction API")
     print("="*70)
@@ -0,0 +1,366 @@
+# =========================================================
+# RAWASI Benchmarks
+# Latency/throughput baselines for every endpoint, offline
+# =========================================================
+#
+# Runs against Flask test clients (no server, no network). Gemini is
+# replaced by llm_gateway.StubModel with --llm-latency of simulated
+# upstream delay, and the insight/plan caches start empty in a temp dir,
+# so runs are repeatable.
+#
+# Run from rawasi-backend/:
+#   python benchmarks/bench.py                         # writes benchmarks/results/<commit>.json
+#   python benchmarks/bench.py --quick --only predict
+#   python benchmarks/bench.py --compare benchmarks/results/<old>.json
+#
+# --compare exits with status 1 when a p50 or p95 got slower (or
+# requests/sec lower) than the baseline by more than --threshold percent.
+
+import argparse
+import base64
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+# Start from empty caches (must be set before the services are imported)
+_cache_dir = tempfile.mkdtemp(prefix='rawasi-bench-')
+os.environ['INSIGHT_CACHE_PATH'] = os.path.join(_cache_dir, 'insights.sqlite3')
+os.environ['PLAN_CACHE_PATH'] = os.path.join(_cache_dir, 'plans.sqlite3')
+os.environ['LLM_BACKEND'] = 'stub'
+
+for path in (BACKEND_DIR, os.path.join(BACKEND_DIR, 'Recommendation'), os.path.join(BACKEND_DIR, 'Timeline')):
+    sys.path.append(path)
+
+import numpy as np
+
+import llm_gateway
+from instrumentation import flush_logs
+
+PROJECT_TYPES = ['Residential', 'Commercial', 'Industrial', 'Infrastructure', 'Healthcare', 'Education']
+LOCATIONS = ['Riyadh', 'Jeddah', 'Dammam', 'Makkah', 'Madinah', 'Khobar', 'Tabuk', 'Abha', 'Unknown']
+TECHNIQUES = ['BIM', 'Precast system', '3D printing', 'Modular construction', 'Light steel frame',
+              'Prefabricated components', 'ALC', 'Hollow core slabs']
+BATCH_SIZES = (1, 10, 100, 1000)
+
+PLAN_IMAGE = os.path.join(BACKEND_DIR, 'Recommendation', 'plan1.png')
+
+
+def percentile_stats(seconds):
+    """p50/p95/p99, mean, min and max in milliseconds"""
+    ms = np.asarray(seconds, dtype=float) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'count': int(ms.size),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(ms.mean()), 4),
+        'min_ms': round(float(ms.min()), 4),
+        'max_ms': round(float(ms.max()), 4)
+    }
+
+
+class Project:
+    """Deterministic random project inputs in each API's field names"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def _draw(self):
+        rng = self.rng
+        return {
+            'type': rng.choice(PROJECT_TYPES),
+            'location': rng.choice(LOCATIONS),
+            'size': round(rng.uniform(100, 20000), 1),
+            'months': rng.randint(3, 48),
+            'floors': rng.randint(1, 30),
+            'complexity': rng.randint(1, 5),
+            'techs': rng.sample(TECHNIQUES, rng.randint(0, 3))
+        }
+
+    def cost(self):
+        p = self._draw()
+        return {'project_type': p['type'], 'size_sqm': p['size'],
+                'location': p['location'], 'timeline_months': p['months']}
+
+    def timeline(self):
+        p = self._draw()
+        return {'sizeSqm': p['size'], 'Nfloors': p['floors'],
+                'complexity': p['complexity'], 'techNeeds': p['techs']}
+
+    def recommendation(self):
+        p = self._draw()
+        return {'name': 'Benchmark', 'type': p['type'], 'location': p['location'],
+                'sizeSqm': p['size'], 'timelineMonths': p['months'], 'Nfloors': p['floors'],
+                'techNeeds': p['techs'] or ['BIM']}
+
+
+def run_endpoint(client_factory, method, path, payloads, requests, concurrency, warmup):
+    """
+    Time requests to one endpoint
+
+    Parameters:
+    - client_factory: callable returning a Flask test client (one per thread)
+    - payloads: callable(i) -> JSON body for request i
+    - requests: timed requests in total, split across concurrency threads
+
+    Returns:
+    - Latency percentiles, requests/sec and the count of non-2xx responses
+    """
+    for i in range(warmup):
+        getattr(client_factory(), method)(path, json=payloads(i))
+
+    bodies = [payloads(warmup + i) for i in range(requests)]
+    latencies = [0.0] * requests
+    failures = [0] * concurrency
+
+    def worker(thread_index):
+        client = client_factory()
+        call = getattr(client, method)
+        for i in range(thread_index, requests, concurrency):
+            start = time.perf_counter()
+            response = call(path, json=bodies[i])
+            latencies[i] = time.perf_counter() - start
+            if response.status_code >= 300:
+                failures[thread_index] += 1
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(concurrency)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    stats = percentile_stats(latencies)
+    stats.update({
+        'requests_per_sec': round(requests / wall, 2),
+        'concurrency': concurrency,
+        'errors': sum(failures)
+    })
+    return stats
+
+
+def run_micro(fn, args_list, repeat):
+    """Time fn(*args) for each args in args_list, repeat passes"""
+    latencies = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - start)
+    stats = percentile_stats(latencies)
+    stats['calls_per_sec'] = round(len(latencies) / sum(latencies), 2)
+    return stats
+
+
+def load_services():
+    """Build each service's app once (models, predictor, suppliers)"""
+    import model_api
+    import recommendation_api
+    import Time
+    return {
+        'cost': (model_api, model_api.create_app()),
+        'timeline': (Time, Time.create_app()),
+        'recommendation': (recommendation_api, recommendation_api.create_app())
+    }
+
+
+def endpoint_scenarios(services, args):
+    """(name, app, method, path, payloads, requests) for every endpoint benchmark"""
+    n = args.requests
+    seed = args.seed
+    with open(PLAN_IMAGE, 'rb') as f:
+        plan = 'data:image/png;base64,' + base64.b64encode(f.read()).decode('ascii')
+
+    scenarios = [
+        ('predict', services['cost'][1], 'post', '/predict',
+         lambda i, g=Project(seed): g.cost(), n)
+    ]
+    for size in BATCH_SIZES:
+        # Fewer requests for large batches so each scenario takes similar time
+        batch_requests = max(5, n * 10 // (size + 9))
+        scenarios.append((
+            f'batch_predict_{size}', services['cost'][1], 'post', '/batch-predict',
+            lambda i, g=Project(seed), size=size: {'projects': [g.cost() for _ in range(size)]},
+            batch_requests
+        ))
+    scenarios += [
+        ('predict_timeline', services['timeline'][1], 'post', '/api/predict-timeline',
+         lambda i, g=Project(seed): g.timeline(), n),
+        ('recommend', services['recommendation'][1], 'post', '/api/recommend',
+         lambda i, g=Project(seed): g.recommendation(), n),
+        ('recommend_plan_image', services['recommendation'][1], 'post', '/api/recommend',
+         lambda i, g=Project(seed): dict(g.recommendation(), planImage=plan), max(5, n // 5)),
+    ]
+    return scenarios
+
+
+def micro_scenarios(services, args):
+    """(name, fn, args_list) for every microbenchmark"""
+    model_api = services['cost'][0]
+    recommendation = services['recommendation'][0].recommendation_api
+    predictor = services['timeline'][0].predictor
+    count = args.micro_calls
+
+    cost_gen, timeline_gen, supplier_gen = Project(args.seed), Project(args.seed), Project(args.seed)
+    cost_args = [tuple(cost_gen.cost().values()) for _ in range(count)]
+    fallback_args = []
+    for _ in range(count):
+        p = timeline_gen.timeline()
+        fallback_args.append((p['sizeSqm'], p['Nfloors'], p['complexity'],
+                              p['techNeeds'] or predictor.all_techniques))
+    supplier_args = [(supplier_gen.recommendation(),) for _ in range(count)]
+
+    def cold_cost(*cost_inputs):
+        model_api.prediction_cache.clear()
+        return model_api.predict_cost_from_inputs(*cost_inputs)
+
+    return [
+        ('predict_cost_from_inputs', model_api.predict_cost_from_inputs, cost_args),
+        ('predict_cost_from_inputs_uncached', cold_cost, cost_args),
+        ('find_matching_suppliers', recommendation.find_matching_suppliers, supplier_args),
+        ('modern_fallback_estimation', predictor.modern_fallback_estimation, fallback_args),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, baseline, threshold):
+    """Print changes against a baseline run; returns the regressed benchmark names"""
+    regressions = []
+    changed = {key: (baseline.get('settings', {}).get(key), value)
+               for key, value in results['settings'].items()
+               if baseline.get('settings', {}).get(key) != value}
+    if changed:
+        print(f"⚠️ Settings differ from the baseline ({baseline.get('commit', '?')}): {changed}")
+    print(f"\n{'benchmark':<42} {'p50 Δ%':>8} {'p95 Δ%':>8} {'rate Δ%':>8}")
+    for section, rate_key in (('endpoints', 'requests_per_sec'), ('micro', 'calls_per_sec')):
+        for name, current in results[section].items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            deltas = {
+                key: (current[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                for key in ('p50_ms', 'p95_ms', rate_key)
+            }
+            regressed = (deltas['p50_ms'] > threshold or deltas['p95_ms'] > threshold
+                         or deltas[rate_key] < -threshold)
+            if regressed:
+                regressions.append(f'{section}.{name}')
+            print(f"{section + '.' + name:<42} {deltas['p50_ms']:>+8.1f} {deltas['p95_ms']:>+8.1f} "
+                  f"{deltas[rate_key]:>+8.1f}{'  ⚠️ regression' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RAWASI endpoint and microbenchmarks')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per endpoint')
+    parser.add_argument('--warmup', type=int, default=10, help='untimed requests per endpoint')
+    parser.add_argument('--micro-calls', type=int, default=2000, help='distinct inputs per microbenchmark')
+    parser.add_argument('--micro-repeat', type=int, default=3, help='passes over the microbenchmark inputs')
+    parser.add_argument('--llm-latency', type=float, default=50, help='simulated LLM latency (ms)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='*', help='run only benchmarks whose name contains one of these')
+    parser.add_argument('--quick', action='store_true', help='small run for a smoke test')
+    parser.add_argument('--output', help='result JSON path (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='baseline result JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold (percent)')
+    args = parser.parse_args()
+    if args.quick:
+        args.requests, args.warmup, args.micro_calls, args.micro_repeat = 20, 2, 200, 1
+
+    stub = llm_gateway.gateway.use_stub(llm_gateway.StubModel(delay=args.llm_latency / 1000))
+
+    def selected(name):
+        return not args.only or any(part in name for part in args.only)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+            'micro_calls': args.micro_calls,
+            'micro_repeat': args.micro_repeat,
+            'llm_latency_ms': args.llm_latency,
+            'seed': args.seed
+        },
+        'endpoints': {},
+        'micro': {}
+    }
+
+    print("🚀 RAWASI benchmarks")
+    # The services log every request; keep their output out of the report
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            services = load_services()
+            flush_logs()
+
+        for name, app, method, path, payloads, requests in endpoint_scenarios(services, args):
+            if not selected(name):
+                continue
+            with contextlib.redirect_stdout(devnull):
+                stats = run_endpoint(app.test_client, method, path, payloads,
+                                     requests, args.concurrency, args.warmup)
+                flush_logs()
+            results['endpoints'][name] = dict(stats, path=path)
+            print(f"✅ {name:<28} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+                  f"p99 {stats['p99_ms']:>9.2f} ms  {stats['requests_per_sec']:>9.1f} req/s"
+                  f"{'  ⚠️ ' + str(stats['errors']) + ' errors' if stats['errors'] else ''}")
+
+        for name, fn, args_list in micro_scenarios(services, args):
+            if not selected(name):
+                continue
+            with contextlib.redirect_stdout(devnull):
+                stats = run_micro(fn, args_list, args.micro_repeat)
+                flush_logs()
+            results['micro'][name] = stats
+            print(f"✅ {name:<34} p50 {stats['p50_ms'] * 1000:>9.1f} µs  p99 {stats['p99_ms'] * 1000:>9.1f} µs  "
+                  f"{stats['calls_per_sec']:>11.0f} calls/s")
+
+    results['llm_stub_calls'] = stub.calls
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+# Lets pytest import the top-level service modules (run from rawasi-backend/)
+import os
+import sys
+
+os.environ.setdefault('LLM_BACKEND', 'stub')
+
+# The service directories, as gunicorn.conf.py puts them on the path
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.extend(os.path.join(BASE_DIR, service_dir) for service_dir in ('Recommendation', 'Timeline'))
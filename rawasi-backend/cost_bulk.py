@@ -0,0 +1,170 @@
+# =========================================================
+# RAWASI Bulk Scoring
+# Constant-memory scoring of NDJSON/CSV project streams
+# =========================================================
+#
+# Rows are parsed one at a time, scored BATCH_CHUNK_SIZE at a time through
+# score_projects and rendered chunk by chunk, so memory depends on the
+# chunk size rather than on the number of rows.
+
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+
+from cost_engine import BATCH_CHUNK_SIZE, score_projects
+
+BULK_FORMATS = ('ndjson', 'csv')
+
+# Largest accepted bulk request body
+BULK_MAX_BYTES = int(float(os.getenv('BULK_MAX_MB', 512)) * 1024 * 1024)
+
+# Uploads are kept in memory up to this size, then spooled to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+COPY_CHUNK_BYTES = 64 * 1024
+
+# Columns of the CSV output
+CSV_FIELDS = (
+    'index', 'success', 'predicted_cost', 'confidence_lower', 'confidence_upper', 'cost_per_sqm',
+    'project_type', 'size_sqm', 'location', 'timeline_months', 'rate_sar_m2', 'error'
+)
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+
+class BulkTooLarge(ValueError):
+    """The bulk request body exceeds BULK_MAX_BYTES"""
+
+
+def spool_body(stream, max_bytes=BULK_MAX_BYTES):
+    """Copy a request body stream into a spooled temporary file"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    total = 0
+    while True:
+        chunk = stream.read(COPY_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            spooled.close()
+            raise BulkTooLarge(f"Request body exceeds {max_bytes // (1024 * 1024)} MB")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def read_ndjson(lines):
+    """Yield one project per non-blank line; unparsable lines yield their ValueError"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON on line {number}: {e}")
+
+
+def read_csv(lines):
+    """Yield one project per CSV record; empty cells fall back to the batch defaults"""
+    for record in csv.DictReader(lines):
+        yield {field: value for field, value in record.items() if field and value not in (None, '')}
+
+
+def read_projects(fileobj, input_format):
+    """
+    Parse projects from a binary file object
+
+    Parameters:
+    - fileobj: UTF-8 encoded NDJSON or CSV (with a header row)
+    - input_format: 'ndjson' or 'csv'
+
+    Returns:
+    - Iterator of project dicts (or ValueErrors for unreadable rows)
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    return read_csv(text) if input_format == 'csv' else read_ndjson(text)
+
+
+def score_chunks(model, projects, chunk_size=BATCH_CHUNK_SIZE, target='log1p'):
+    """
+    Score an iterator of projects chunk by chunk
+
+    Parameters:
+    - model: fitted pipeline (or CostKernel)
+    - projects: iterable of project dicts; exceptions in it are reported
+      as failed rows
+    - chunk_size: rows per vectorized pass
+    - target: 'log1p' if the model predicts log1p(cost), 'raw' for cost
+
+    Yields:
+    - List of results per chunk, each carrying its row "index"
+    """
+    projects = iter(projects)
+    offset = 0
+    while True:
+        chunk = list(itertools.islice(projects, chunk_size))
+        if not chunk:
+            return
+        results = score_projects(
+            model, [None if isinstance(p, Exception) else p for p in chunk], chunk_size, target
+        )
+        for i, (project, result) in enumerate(zip(chunk, results)):
+            if isinstance(project, Exception):
+                result = {"success": False, "error": str(project)}
+            result['index'] = offset + i
+            results[i] = result
+        offset += len(chunk)
+        yield results
+
+
+def render_ndjson(chunks):
+    """One JSON result per line"""
+    for results in chunks:
+        yield ''.join(_encode(result) + '\n' for result in results)
+
+
+def result_row(result):
+    """Flatten one indexed prediction result into CSV_FIELDS order (None where absent)"""
+    inputs = result.get('inputs', {})
+    interval = result.get('confidence_interval', {})
+    return (
+        result['index'], result['success'], result.get('predicted_cost'),
+        interval.get('lower'), interval.get('upper'), result.get('cost_per_sqm'),
+        inputs.get('project_type'), inputs.get('size_sqm'), inputs.get('location'),
+        inputs.get('timeline_months'), inputs.get('rate_sar_m2'), result.get('error')
+    )
+
+
+def render_csv(chunks):
+    """Header row, then one CSV record per result"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for results in chunks:
+        writer.writerows(map(result_row, results))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # header only, no rows
+
+
+def iter_bulk(model, fileobj, input_format='ndjson', output_format=None,
+              chunk_size=BATCH_CHUNK_SIZE, target='log1p'):
+    """
+    Score a bulk upload and render the results incrementally
+
+    Parameters:
+    - fileobj: binary file object with the rows (closed when done)
+    - input_format / output_format: 'ndjson' or 'csv' (output defaults to input)
+
+    Yields:
+    - Text blocks of rendered results, one per chunk
+    """
+    render = render_csv if (output_format or input_format) == 'csv' else render_ndjson
+    try:
+        yield from render(score_chunks(model, read_projects(fileobj, input_format), chunk_size, target))
+    finally:
+        fileobj.close()
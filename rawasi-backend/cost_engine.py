@@ -0,0 +1,211 @@
+# =========================================================
+# RAWASI Cost Engine
+# Input mapping and vectorized batch scoring for the cost model
+# =========================================================
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from location_index import LOOKUP_CACHE_SIZE, locations, normalize_name
+
+# Rows scored per model.predict call in batch mode
+BATCH_CHUNK_SIZE = 4096
+
+# Default values used when a batch row omits a field
+BATCH_DEFAULTS = {
+    "project_type": "Residential",
+    "size_sqm": 1500,
+    "location": "Riyadh",
+    "timeline_months": 12,
+    "rate_sar_m2": 750
+}
+
+# Model sectors values and the project types (English/Arabic) that map to them.
+# The values are spelled exactly as in the training data, leading space included;
+# the models were never trained on mixed-use projects, so that sector adds nothing.
+SECTOR_ALIASES = {
+    " سكني": ("Residential", "Housing", "Villa", "Apartment", "سكني"),
+    " تجاري": ("Commercial", "Retail", "Office", "تجاري"),
+    " صناعي": ("Industrial", "Factory", "Warehouse", "صناعي"),
+    " مختلط": ("Mixed-Use", "Mixed Use", "Mixed", "مختلط"),
+    " تعليمي": ("Educational", "Education", "School", "تعليمي"),
+    " صحي": ("Healthcare", "Health", "Hospital", "صحي"),
+    " حكومي": ("Government", "Governmental", "حكومي"),
+    " ترفيهي/سياحي": ("Entertainment", "Tourism", "Hospitality", "ترفيهي", "سياحي", "ترفيهي/سياحي"),
+    " ديني/خيري": ("Religious", "Charity", "Mosque", "ديني", "خيري", "ديني/خيري"),
+    " رياضي": ("Sports", "Sport", "رياضي"),
+    " علمي": ("Scientific", "Research", "علمي"),
+}
+DEFAULT_SECTOR = " سكني"
+_SECTORS = {normalize_name(alias): sector for sector, aliases in SECTOR_ALIASES.items() for alias in aliases}
+
+# Locations missing from the gazetteer (saudi_locations.json) are priced as Riyadh
+DEFAULT_LOCATION = "Riyadh"
+
+FEATURE_COLUMNS = [
+    'sectors',
+    'macro_region',
+    'city',
+    'area_project_imputed_m2',
+    'rate_used_sar_m2',
+    'duration_days'
+]
+
+
+_DEFAULT_MODEL_REGION = locations.resolve(DEFAULT_LOCATION).model_region
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def map_sector(project_type):
+    """Map a frontend project type (English or Arabic) to the model's sectors value"""
+    return _SECTORS.get(normalize_name(project_type), DEFAULT_SECTOR)
+
+
+def map_location(location):
+    """Map a Saudi city or region (English or Arabic) to the model's (macro_region, city) pair"""
+    place = locations.resolve(location)
+    return place.model_region if place is not None else _DEFAULT_MODEL_REGION
+
+
+def format_result(pred_cost, confidence_lower, confidence_upper, cost_per_sqm, inputs):
+    """Format one prediction response from computed values and parsed inputs"""
+    project_type, size_sqm, location, timeline_months, rate_sar_m2 = inputs
+    return {
+        "success": True,
+        "predicted_cost": round(pred_cost, 2),
+        "confidence_interval": {
+            "lower": round(confidence_lower, 2),
+            "upper": round(confidence_upper, 2)
+        },
+        "cost_per_sqm": round(cost_per_sqm, 2),
+        "inputs": {
+            "project_type": project_type,
+            "size_sqm": size_sqm,
+            "location": location,
+            "timeline_months": timeline_months,
+            "rate_sar_m2": rate_sar_m2
+        }
+    }
+
+
+def build_result(pred_cost, project_type, size_sqm, location, timeline_months, rate_sar_m2):
+    """Build the prediction response for one project from its predicted cost"""
+    # Calculate confidence interval (rough estimate based on ±15% variation)
+    return format_result(
+        pred_cost,
+        pred_cost * 0.85,
+        pred_cost * 1.15,
+        pred_cost / size_sqm,
+        (project_type, size_sqm, location, timeline_months, rate_sar_m2)
+    )
+
+
+def prepare_batch(projects):
+    """
+    Validate and map a list of project dicts into columnar model inputs
+
+    Returns:
+    - columns: dict of feature name -> list, one entry per valid row
+    - inputs: list of (index, parsed inputs tuple) for the valid rows
+    - errors: dict of index -> error response for rejected rows
+    """
+    columns = {name: [] for name in FEATURE_COLUMNS}
+    inputs = []
+    errors = {}
+
+    for index, project in enumerate(projects):
+        try:
+            if not isinstance(project, dict):
+                raise ValueError("Project must be a JSON object")
+
+            project_type = project.get('project_type', BATCH_DEFAULTS['project_type'])
+            size_sqm = float(project.get('size_sqm', BATCH_DEFAULTS['size_sqm']))
+            location = project.get('location', BATCH_DEFAULTS['location'])
+            timeline_months = int(project.get('timeline_months', BATCH_DEFAULTS['timeline_months']))
+            rate_sar_m2 = float(project.get('rate_sar_m2', BATCH_DEFAULTS['rate_sar_m2']))
+
+            if not size_sqm > 0:
+                raise ValueError("size_sqm must be greater than 0")
+
+            macro_region, city = map_location(location)
+        except Exception as e:
+            errors[index] = {
+                "success": False,
+                "index": index,
+                "error": str(e)
+            }
+            continue
+
+        columns['sectors'].append(map_sector(project_type))
+        columns['macro_region'].append(macro_region)
+        columns['city'].append(city)
+        columns['area_project_imputed_m2'].append(size_sqm)
+        columns['rate_used_sar_m2'].append(rate_sar_m2)
+        columns['duration_days'].append(float(timeline_months * 30))
+        inputs.append((index, (project_type, size_sqm, location, timeline_months, rate_sar_m2)))
+
+    return columns, inputs, errors
+
+
+def predict_outputs(model, columns, chunk_size=BATCH_CHUNK_SIZE):
+    """Run model.predict over columnar inputs in fixed-size chunks"""
+    # Compiled kernels score columns directly, no DataFrame needed
+    if hasattr(model, 'predict_columns'):
+        with stage('model_predict'):
+            return model.predict_columns(columns)
+
+    with stage('dataframe_build'):
+        frame = pd.DataFrame(columns, columns=FEATURE_COLUMNS)
+    n_rows = len(frame)
+    if n_rows == 0:
+        return np.empty(0, dtype=float)
+
+    preds = np.empty(n_rows, dtype=float)
+    with stage('model_predict'):
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            preds[start:stop] = model.predict(frame.iloc[start:stop])
+    return preds
+
+
+def to_costs(outputs, target='log1p'):
+    """Convert raw model outputs to non-negative costs (SAR)"""
+    costs = np.expm1(outputs) if target == 'log1p' else np.asarray(outputs, dtype=float)
+    return np.maximum(costs, 0.0)
+
+
+def score_projects(model, projects, chunk_size=BATCH_CHUNK_SIZE, target='log1p'):
+    """
+    Score a list of projects with a single vectorized pass through the model
+
+    Parameters:
+    - model: fitted pipeline (or CostKernel)
+    - projects: list of project dicts (same fields as /predict)
+    - chunk_size: maximum rows per model.predict call
+    - target: 'log1p' if the model predicts log1p(cost), 'raw' for cost
+
+    Returns:
+    - List of prediction results in input order; rejected rows carry
+      "success": False and their "index"
+    """
+    # Validating and mapping rows into model columns is the batch's "DataFrame build"
+    with stage('dataframe_build'):
+        columns, inputs, errors = prepare_batch(projects)
+
+    pred_costs = to_costs(predict_outputs(model, columns, chunk_size), target)
+
+    # Confidence interval (±15%) and unit cost for every row at once
+    lower = pred_costs * 0.85
+    upper = pred_costs * 1.15
+    per_sqm = pred_costs / np.asarray(columns['area_project_imputed_m2'], dtype=float)
+
+    results = [None] * len(projects)
+    for index, error in errors.items():
+        results[index] = error
+    rows = zip(inputs, pred_costs.tolist(), lower.tolist(), upper.tolist(), per_sqm.tolist())
+    for (index, row_inputs), pred_cost, low, high, unit in rows:
+        results[index] = format_result(pred_cost, low, high, unit, row_inputs)
+    return results
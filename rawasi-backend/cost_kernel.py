@@ -0,0 +1,209 @@
+# =========================================================
+# RAWASI Cost Kernel
+# Pandas-free inference for the fitted linear cost pipeline
+# =========================================================
+
+import itertools
+import math
+
+import numpy as np
+
+# Maximum allowed kernel vs model.predict difference in the load-time parity check
+PARITY_TOLERANCE = 1e-9
+
+
+class CostKernel:
+    """
+    Flat representation of a fitted (preprocess -> linear) pipeline
+
+    Numeric columns are transformed element-wise (log1p or standard
+    scaling) and multiplied by their coefficients; each categorical column
+    becomes a lookup table of value -> summed one-hot coefficient, with
+    unknown values contributing 0 (OneHotEncoder handle_unknown='ignore').
+    """
+
+    def __init__(self, num_cols, num_transform, num_offset, num_scale, num_coef,
+                 cat_cols, cat_tables, intercept):
+        self.num_cols = list(num_cols)
+        self.num_transform = num_transform
+        self.num_offset = np.asarray(num_offset, dtype=float)
+        self.num_scale = np.asarray(num_scale, dtype=float)
+        self.num_coef = np.asarray(num_coef, dtype=float)
+        self.cat_cols = list(cat_cols)
+        self.cat_tables = cat_tables
+        self.intercept = float(intercept)
+
+        # Plain-float copies for the scalar path
+        self._offset = self.num_offset.tolist()
+        self._scale = self.num_scale.tolist()
+        self._coef = self.num_coef.tolist()
+
+    @property
+    def feature_columns(self):
+        return self.num_cols + self.cat_cols
+
+    def predict_row(self, row):
+        """Predict one row given as a dict of feature name -> value"""
+        total = self.intercept
+        for col, table in zip(self.cat_cols, self.cat_tables):
+            total += table.get(row[col], 0.0)
+
+        log1p = self.num_transform == 'log1p'
+        for col, offset, scale, coef in zip(self.num_cols, self._offset, self._scale, self._coef):
+            value = float(row[col])
+            if log1p:
+                value = math.log1p(value)
+            total += coef * ((value - offset) / scale)
+        return total
+
+    def predict_columns(self, columns):
+        """Predict many rows given as a dict of feature name -> sequence"""
+        num = np.column_stack([np.asarray(columns[col], dtype=float) for col in self.num_cols])
+        if self.num_transform == 'log1p':
+            num = np.log1p(num)
+        preds = ((num - self.num_offset) / self.num_scale) @ self.num_coef + self.intercept
+
+        for col, table in zip(self.cat_cols, self.cat_tables):
+            preds += np.fromiter((table.get(v, 0.0) for v in columns[col]), dtype=float, count=len(preds))
+        return preds
+
+    def contributions(self, column, values):
+        """
+        Term each value of one feature column adds to the prediction
+
+        The model is additive over its features, so a prediction is the
+        intercept plus one term per column. Columns the model doesn't use
+        contribute 0.
+        """
+        if column in self.cat_cols:
+            table = self.cat_tables[self.cat_cols.index(column)]
+            return np.fromiter((table.get(v, 0.0) for v in values), dtype=float, count=len(values))
+        x = np.asarray(values, dtype=float)
+        if column not in self.num_cols:
+            return np.zeros(len(x))
+        i = self.num_cols.index(column)
+        if self.num_transform == 'log1p':
+            x = np.log1p(x)
+        return self.num_coef[i] * ((x - self.num_offset[i]) / self.num_scale[i])
+
+    def predict(self, X):
+        """Drop-in for model.predict on a DataFrame"""
+        return self.predict_columns({col: X[col].to_numpy() for col in self.feature_columns})
+
+
+def _compile_numeric(transformer, n_cols):
+    """Return (transform, offset, scale) for a supported numeric transformer"""
+    if transformer == 'passthrough':
+        return 'identity', np.zeros(n_cols), np.ones(n_cols)
+
+    # Unwrap single-step pipelines such as Pipeline([('scaler', StandardScaler())])
+    if hasattr(transformer, 'steps'):
+        if len(transformer.steps) != 1:
+            raise ValueError("Only single-step numeric pipelines are supported")
+        transformer = transformer.steps[0][1]
+
+    kind = type(transformer).__name__
+    if kind == 'FunctionTransformer':
+        func_name = getattr(transformer.func, '__name__', '')
+        if func_name not in ('log1p_array', 'log1p'):
+            raise ValueError(f"Unsupported numeric function: {func_name}")
+        return 'log1p', np.zeros(n_cols), np.ones(n_cols)
+
+    if kind == 'StandardScaler':
+        offset = transformer.mean_ if transformer.with_mean else np.zeros(n_cols)
+        scale = transformer.scale_ if transformer.with_std else np.ones(n_cols)
+        return 'identity', offset, scale
+
+    raise ValueError(f"Unsupported numeric transformer: {kind}")
+
+
+def compile_kernel(model):
+    """
+    Compile a fitted sklearn pipeline into a CostKernel
+
+    Supports Pipeline(ColumnTransformer(num, OneHotEncoder) -> linear model)
+    as shipped in rawasi_model/. Raises ValueError for anything else.
+    """
+    steps = getattr(model, 'steps', None)
+    if not steps or len(steps) != 2:
+        raise ValueError("Expected a two-step (preprocess, linear) pipeline")
+
+    pre, linear = steps[0][1], steps[1][1]
+    coef = np.ravel(linear.coef_)
+    intercept = float(np.ravel(linear.intercept_)[0])
+
+    num_cols, cat_cols, cat_tables = [], [], []
+    num_parts = None
+    position = 0
+
+    for name, transformer, columns in pre.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        columns = list(columns)
+
+        if type(transformer).__name__ == 'OneHotEncoder':
+            if transformer.drop is not None:
+                raise ValueError("OneHotEncoder with drop is not supported")
+            if transformer.handle_unknown != 'ignore':
+                raise ValueError("OneHotEncoder must use handle_unknown='ignore'")
+            if getattr(transformer, 'infrequent_categories_', None) is not None:
+                raise ValueError("Infrequent category grouping is not supported")
+
+            for col, categories in zip(columns, transformer.categories_):
+                weights = coef[position:position + len(categories)]
+                cat_tables.append({cat: float(w) for cat, w in zip(categories.tolist(), weights)})
+                cat_cols.append(col)
+                position += len(categories)
+        else:
+            if num_parts is not None:
+                raise ValueError("Only one numeric transformer is supported")
+            transform, offset, scale = _compile_numeric(transformer, len(columns))
+            num_parts = (transform, offset, scale, coef[position:position + len(columns)])
+            num_cols = columns
+            position += len(columns)
+
+    if position != len(coef):
+        raise ValueError(f"Feature count mismatch: {position} != {len(coef)}")
+    if num_parts is None:
+        raise ValueError("No numeric transformer found")
+
+    transform, offset, scale, num_coef = num_parts
+    return CostKernel(num_cols, transform, offset, scale, num_coef, cat_cols, cat_tables, intercept)
+
+
+def verify_parity(kernel, model, tolerance=PARITY_TOLERANCE, seed=0):
+    """
+    Check the kernel against model.predict across the category space
+
+    Scores every combination of known categories (plus one unseen value
+    per column) with random numeric inputs, through both the vectorized
+    and the scalar kernel paths. Differences are measured relative to
+    max(1, |prediction|) so raw-currency targets are held to the same
+    precision as log targets. Returns the maximum difference and raises
+    ValueError if it exceeds the tolerance.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    levels = [list(table) + ['__unseen__'] for table in kernel.cat_tables]
+    combos = list(itertools.product(*levels))
+    n_rows = len(combos)
+
+    columns = {col: [combo[i] for combo in combos] for i, col in enumerate(kernel.cat_cols)}
+    for col in kernel.num_cols:
+        columns[col] = rng.uniform(1.0, 1e5, size=n_rows)
+
+    frame = pd.DataFrame(columns)
+    expected = model.predict(frame)
+    vectorized = kernel.predict_columns(columns)
+    sample = rng.choice(n_rows, size=min(n_rows, 500), replace=False)
+    scalar = np.array([kernel.predict_row(frame.iloc[i]) for i in sample])
+
+    scale = np.maximum(1.0, np.abs(expected))
+    max_diff = max(
+        float(np.max(np.abs(vectorized - expected) / scale)),
+        float(np.max(np.abs(scalar - expected[sample]) / scale[sample]))
+    )
+    if max_diff > tolerance:
+        raise ValueError(f"Kernel parity check failed: max diff {max_diff:.3e} > {tolerance:.0e}")
+    return max_diff
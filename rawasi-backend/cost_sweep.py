@@ -0,0 +1,234 @@
+# =========================================================
+# RAWASI Cost Sweep
+# Scores parameter grids lazily, in vectorized chunks
+# =========================================================
+#
+# A sweep is the Cartesian product of value lists for the five /predict
+# inputs. Points are numbered in row-major order over SWEEP_AXES (the
+# last axis varies fastest) and only one chunk of them exists at a time,
+# so memory stays flat however large the grid is.
+
+import json
+import math
+import os
+
+import numpy as np
+
+from cost_engine import BATCH_DEFAULTS, map_location, map_sector, predict_outputs, to_costs
+from instrumentation import stage
+
+# Grid axes in point order (rate_sar_m2 varies fastest)
+SWEEP_AXES = ('project_type', 'location', 'size_sqm', 'timeline_months', 'rate_sar_m2')
+CATEGORICAL_AXES = ('project_type', 'location')
+
+SWEEP_MAX_POINTS = int(os.getenv('SWEEP_MAX_POINTS', 5_000_000))
+SWEEP_CHUNK_SIZE = int(os.getenv('SWEEP_CHUNK_SIZE', 65536))
+
+# Confidence interval factors applied to every predicted cost (±15%, as in build_result)
+CONFIDENCE_LOWER = 0.85
+CONFIDENCE_UPPER = 1.15
+
+
+# One NDJSON point: index, cost, interval, unit cost and the five inputs
+NDJSON_ROW = (
+    '{"index":%d,"predicted_cost":%.2f,"confidence_interval":{"lower":%.2f,"upper":%.2f},'
+    '"cost_per_sqm":%.2f,"inputs":{%s,%s,%s,%s,%s}}\n'
+)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def axis_values(name, spec, max_points=SWEEP_MAX_POINTS):
+    """
+    Expand one axis spec into its list of values
+
+    Parameters:
+    - name: axis name (one of SWEEP_AXES)
+    - spec: a single value, a list of values, or (numeric axes only)
+      {"start", "stop", "step"} with an inclusive stop, or
+      {"start", "stop", "num"} for num evenly spaced values
+    - max_points: upper bound on the number of values
+
+    Returns:
+    - List of typed values
+    """
+    if isinstance(spec, dict):
+        if name in CATEGORICAL_AXES:
+            raise ValueError(f"{name} takes a value or a list of values")
+        if 'start' not in spec:
+            raise ValueError(f"{name} range needs a start")
+        start = float(spec['start'])
+        stop = float(spec.get('stop', start))
+        if 'num' in spec:
+            num = int(spec['num'])
+            if not 1 <= num <= max_points:
+                raise ValueError(f"{name} num must be between 1 and {max_points}")
+            values = np.linspace(start, stop, num).tolist()
+        elif 'step' in spec:
+            step = float(spec['step'])
+            if not step > 0:
+                raise ValueError(f"{name} step must be greater than 0")
+            if stop < start:
+                raise ValueError(f"{name} stop must not be less than start")
+            # Tolerate float error so an inclusive stop isn't lost
+            count = math.floor((stop - start) / step + 1e-9) + 1
+            if count > max_points:
+                raise ValueError(f"{name} range has more than {max_points} values")
+            values = (start + step * np.arange(count)).tolist()
+        else:
+            raise ValueError(f"{name} range needs a step or num")
+    elif isinstance(spec, list):
+        values = spec
+    else:
+        values = [spec]
+
+    if not values:
+        raise ValueError(f"{name} has no values")
+    if len(values) > max_points:
+        raise ValueError(f"{name} has more than {max_points} values")
+
+    if name in CATEGORICAL_AXES:
+        return [str(v) for v in values]
+    if name == 'timeline_months':
+        return [int(v) for v in values]
+    values = [float(v) for v in values]
+    if name == 'size_sqm' and not all(v > 0 for v in values):
+        raise ValueError("size_sqm must be greater than 0")
+    return values
+
+
+class CostSweep:
+    """
+    Lazily expanded grid of cost model inputs
+
+    Parameters:
+    - grid: dict of axis name -> spec (see axis_values); missing axes use
+      the /batch-predict defaults
+    - chunk_size: points scored per vectorized pass
+    - max_points: largest grid accepted
+    """
+
+    def __init__(self, grid, chunk_size=SWEEP_CHUNK_SIZE, max_points=SWEEP_MAX_POINTS):
+        if not isinstance(grid, dict):
+            raise ValueError("grid must be a JSON object")
+        unknown = sorted(set(grid) - set(SWEEP_AXES))
+        if unknown:
+            raise ValueError(f"Unknown grid axes: {', '.join(unknown)}")
+
+        self.axes = {
+            name: axis_values(name, grid.get(name, BATCH_DEFAULTS[name]), max_points)
+            for name in SWEEP_AXES
+        }
+        self.shape = tuple(len(values) for values in self.axes.values())
+        self.size = math.prod(self.shape)
+        if self.size > max_points:
+            raise ValueError(f"Grid has {self.size} points; the limit is {max_points}")
+        self.chunk_size = max(1, int(chunk_size))
+
+    def features(self):
+        """Model feature columns for each axis's values, in SWEEP_AXES order"""
+        regions = [map_location(location) for location in self.axes['location']]
+        return [
+            {'sectors': [map_sector(t) for t in self.axes['project_type']]},
+            {'macro_region': [macro for macro, _ in regions], 'city': [city for _, city in regions]},
+            {'area_project_imputed_m2': self.axes['size_sqm']},
+            {'duration_days': [float(months * 30) for months in self.axes['timeline_months']]},
+            {'rate_used_sar_m2': self.axes['rate_sar_m2']},
+        ]
+
+    def scores(self, predictor, target='log1p'):
+        """
+        Score the grid chunk by chunk
+
+        Compiled kernels are additive over features, so each axis value's
+        term is computed once and a chunk is the sum of gathered terms.
+        Other models get the chunk's feature columns built and predicted.
+
+        Yields:
+        - (start, index, costs): first point number of the chunk, per-axis
+          value index arrays and the predicted costs (SAR)
+        """
+        features = self.features()
+        terms = None
+        if hasattr(predictor, 'contributions'):
+            terms = [
+                sum(predictor.contributions(column, values) for column, values in axis.items())
+                for axis in features
+            ]
+        else:
+            features = [{column: np.asarray(values) for column, values in axis.items()} for axis in features]
+
+        for start in range(0, self.size, self.chunk_size):
+            stop = min(start + self.chunk_size, self.size)
+            index = np.unravel_index(np.arange(start, stop), self.shape)
+            if terms is not None:
+                with stage('model_predict'):
+                    outputs = predictor.intercept + sum(term[i] for term, i in zip(terms, index))
+            else:
+                columns = {
+                    column: values[i]
+                    for axis, i in zip(features, index) for column, values in axis.items()
+                }
+                outputs = predict_outputs(predictor, columns)
+            yield start, index, to_costs(outputs, target)
+
+    def header(self, **extra):
+        """Grid description sent ahead of the scores"""
+        return dict(
+            extra,
+            count=self.size,
+            order=list(SWEEP_AXES),
+            shape=list(self.shape),
+            axes=self.axes
+        )
+
+    def iter_ndjson(self, predictor, target='log1p', **extra):
+        """
+        Stream the sweep as NDJSON
+
+        The first line is the header; every following line is one point,
+        shaped like a /batch-predict prediction plus its grid "index".
+        Each chunk is rendered with a single %-format over a flat table of
+        its values; "%.2f" gives the same numbers as round(x, 2).
+        """
+        yield _dumps(dict(self.header(**extra), success=True)) + '\n'
+
+        # Serialize each axis value once; rows are assembled from the fragments
+        fragments = [
+            np.array([f'"{name}":{_dumps(value)}' for value in values], dtype=object)
+            for name, values in self.axes.items()
+        ]
+        sizes = np.asarray(self.axes['size_sqm'])
+        for start, index, costs in self.scores(predictor, target):
+            n_rows = len(costs)
+            table = np.empty((n_rows, 10), dtype=object)
+            table[:, 0] = np.arange(start, start + n_rows)
+            table[:, 1] = costs
+            table[:, 2] = costs * CONFIDENCE_LOWER
+            table[:, 3] = costs * CONFIDENCE_UPPER
+            table[:, 4] = costs / sizes[index[2]]
+            for column, (fragment, i) in enumerate(zip(fragments, index), start=5):
+                table[:, column] = fragment[i]
+            yield (NDJSON_ROW * n_rows) % tuple(table.ravel().tolist())
+
+    def iter_columnar(self, predictor, target='log1p', **extra):
+        """
+        Stream the sweep as one compact JSON object
+
+        Only "predicted_cost" is sent per point, in grid order; a point's
+        inputs follow from its position (see "order" and "shape"), its
+        interval from "confidence_factors" and its unit cost from size_sqm.
+        """
+        header = dict(
+            self.header(**extra),
+            success=True,
+            confidence_factors={"lower": CONFIDENCE_LOWER, "upper": CONFIDENCE_UPPER}
+        )
+        yield _dumps(header)[:-1] + ',"predicted_cost":['
+        separator = ''
+        for _, _, costs in self.scores(predictor, target):
+            yield separator + (','.join(['%.2f'] * len(costs)) % tuple(costs.tolist()))
+            separator = ','
+        yield ']}'
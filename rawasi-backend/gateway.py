@@ -0,0 +1,244 @@
+# =========================================================
+# RAWASI API Gateway
+# One app serving the cost, timeline and recommendation APIs
+# =========================================================
+#
+# Each service's blueprint is mounted under its own prefix:
+#   /cost/...            model_api (cost prediction)
+#   /timeline/api/...    Timeline/Time.py
+#   /recommendation/api/...  Recommendation/recommendation_api.py
+# plus /api/project-estimate, which runs cost, timeline and supplier
+# matching for one project concurrently and returns them together.
+#
+# Run from rawasi-backend/:
+#   python gateway.py
+#   gunicorn -c gunicorn.conf.py -b 0.0.0.0:8000 'gateway:create_app()'
+
+import os
+import sys
+import time
+
+from flask import Blueprint, Flask, request, jsonify
+from flask_cors import CORS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Under gunicorn the service directories come from gunicorn.conf.py (pythonpath)
+if __name__ == '__main__':
+    sys.path.extend(os.path.join(BASE_DIR, service_dir) for service_dir in ('Recommendation', 'Timeline'))
+
+import model_api
+import recommendation_api
+import Time
+from instrumentation import get_logger, instrument_app
+from plan_image import MAX_REQUEST_BYTES
+from recommendation_api import PipelineStage
+
+bp = Blueprint('gateway', __name__)
+log = get_logger('gateway')
+
+# Prefix each service's blueprint is mounted under
+SERVICES = (
+    ('cost', model_api, '/cost'),
+    ('timeline', Time, '/timeline'),
+    ('recommendation', recommendation_api, '/recommendation'),
+)
+
+# Deadlines (seconds) for the parts of /api/project-estimate. The timeline
+# part returns the rule-based estimate plus a job id if the AI is slower
+# than ESTIMATE_TIMELINE_DEADLINE (poll /timeline/api/predict-timeline/jobs/<id>).
+ESTIMATE_TIMELINE_DEADLINE = float(os.getenv('ESTIMATE_TIMELINE_DEADLINE', 2))
+ESTIMATE_STAGE_TIMEOUT = float(os.getenv('ESTIMATE_STAGE_TIMEOUT', 30))
+ESTIMATE_TOP_SUPPLIERS = int(os.getenv('ESTIMATE_TOP_SUPPLIERS', 5))
+
+
+def create_app():
+    """
+    Application factory
+
+    Initializes every service once (models, predictor, suppliers) and
+    mounts their blueprints on a single app, so one gunicorn master with
+    preload_app shares all of it with its workers.
+
+    Usage: gunicorn -c gunicorn.conf.py -b 0.0.0.0:8000 'gateway:create_app()'
+    """
+    post_fork = []
+    for _, module, _ in SERVICES:
+        post_fork.extend(module.init_service())
+
+    app = Flask(__name__)
+    # Plan uploads are the largest request bodies any service accepts
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+    CORS(app)  # Enable CORS for React frontend
+    for _, module, prefix in SERVICES:
+        app.register_blueprint(module.bp, url_prefix=prefix)
+    app.register_blueprint(bp)
+    instrument_app(app)
+    app.extensions['post_fork'] = post_fork
+    return app
+
+
+def estimate_inputs(data):
+    """
+    Normalize a project-estimate request
+
+    Accepts the frontend's camelCase fields, falling back to the cost
+    API's snake_case names.
+
+    Returns:
+    - Dictionary of typed inputs for the three sub-estimates
+    """
+    def field(name, fallback, default):
+        value = data.get(name)
+        if value is None:
+            value = data.get(fallback)
+        return default if value is None else value
+
+    tech_needs = data.get('techNeeds') or []
+    if not isinstance(tech_needs, list):
+        raise ValueError("techNeeds must be a list")
+    deadline = data.get('deadlineMs')
+    return {
+        'type': str(field('type', 'project_type', 'Residential')),
+        'location': str(field('location', 'location', 'Riyadh')),
+        'sizeSqm': float(field('sizeSqm', 'size_sqm', 1500)),
+        'timelineMonths': int(field('timelineMonths', 'timeline_months', 12)),
+        'Nfloors': int(data.get('Nfloors', 2)),
+        'complexity': int(data.get('complexity', 3)),
+        'techNeeds': tech_needs,
+        'rateSarM2': float(field('rateSarM2', 'rate_sar_m2', 750.0)),
+        'model': data.get('model'),
+        'deadline': float(deadline) / 1000 if deadline is not None else ESTIMATE_TIMELINE_DEADLINE
+    }
+
+
+def estimate_timeline(project):
+    return Time.predictor.predict_hedged(
+        area_sqm=project['sizeSqm'],
+        num_floors=project['Nfloors'],
+        complexity=project['complexity'],
+        selected_techniques=project['techNeeds'] or None,
+        deadline=project['deadline']
+    )
+
+
+def estimate_suppliers(project):
+    matches = recommendation_api.recommendation_api.find_matching_suppliers(project)
+    return {
+        'total_matches': len(matches),
+        'suppliers': matches[:ESTIMATE_TOP_SUPPLIERS]
+    }
+
+
+def estimate_cost(project, stages):
+    """Cost prediction in the calling thread (it's the fastest part)"""
+    start = time.perf_counter()
+    try:
+        result = model_api.predict_cost_from_inputs(
+            project_type=project['type'],
+            size_sqm=project['sizeSqm'],
+            location=project['location'],
+            timeline_months=project['timelineMonths'],
+            rate_sar_m2=project['rateSarM2'],
+            model_name=project['model']
+        )
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+
+    if result.get('success'):
+        stages['cost'] = {'status': 'ok', 'ms': round((time.perf_counter() - start) * 1000, 1)}
+        return result
+    stages['cost'] = {'status': 'error', 'error': result.get('error', 'Cost prediction failed')}
+    log.warning("⚠️ Stage 'cost' failed", stage='cost', error=stages['cost']['error'])
+    return None
+
+
+@bp.route('/health', methods=['GET'])
+def health_check():
+    """Health of every mounted service"""
+    services = {
+        'cost': model_api.health_check().get_json(),
+        'timeline': Time.health_check().get_json(),
+        'recommendation': recommendation_api.health_check().get_json()
+    }
+    healthy = all(service.get('status') == 'healthy' for service in services.values())
+    return jsonify({
+        'status': 'healthy' if healthy else 'degraded',
+        'services': services
+    })
+
+
+@bp.route('/api/project-estimate', methods=['POST'])
+def project_estimate():
+    """
+    Cost, timeline and supplier matches for one project
+
+    Expected JSON body (all optional):
+    {
+        "type": "Residential",
+        "location": "Riyadh",
+        "sizeSqm": 1500,
+        "timelineMonths": 12,
+        "Nfloors": 2,
+        "complexity": 3,            // 1-5, for the timeline
+        "techNeeds": ["BIM"],
+        "rateSarM2": 750,
+        "model": "linreg_boosted",  // cost model
+        "deadlineMs": 2000          // wait for the AI timeline
+    }
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Expected a JSON object"}), 400
+        try:
+            project = estimate_inputs(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        log.info("📥 Project estimate", project_type=project['type'], location=project['location'],
+                 area_sqm=project['sizeSqm'], floors=project['Nfloors'])
+
+        stages = {}
+        # Timeline (possibly an AI call) and supplier matching run in the
+        # background while the cost model scores in this thread
+        timeline_stage = PipelineStage('timeline', ESTIMATE_STAGE_TIMEOUT, estimate_timeline, project)
+        suppliers_stage = PipelineStage('suppliers', ESTIMATE_STAGE_TIMEOUT, estimate_suppliers, project)
+        cost = estimate_cost(project, stages)
+        timeline = timeline_stage.result(stages)
+        suppliers = suppliers_stage.result(stages)
+
+        parts = (cost, timeline, suppliers)
+        return jsonify({
+            'success': any(part is not None for part in parts),
+            'project': {key: project[key] for key in
+                        ('type', 'location', 'sizeSqm', 'timelineMonths', 'Nfloors', 'complexity', 'techNeeds')},
+            'cost': cost,
+            'timeline': timeline,
+            'suppliers': suppliers,
+            'stages': stages,
+            'partial': any(part is None for part in parts)
+        })
+
+    except Exception as e:
+        log.exception("❌ Error in project estimate", error=str(e))
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "message": "Failed to estimate project"
+        }), 500
+
+
+if __name__ == '__main__':
+    app = create_app()
+    for hook in app.extensions['post_fork']:
+        hook()
+    port = int(os.getenv('GATEWAY_PORT', 8000))
+    print("\n" + "="*70)
+    print("🚀 RAWASI API Gateway")
+    print("="*70)
+    for name, _, prefix in SERVICES:
+        print(f"✅ {name}: {prefix}")
+    print(f"📡 Server: http://localhost:{port}")
+    print("="*70 + "\n")
+    app.run(host='0.0.0.0', port=port, debug=True)
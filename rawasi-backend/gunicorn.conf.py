@@ -0,0 +1,47 @@
+# =========================================================
+# RAWASI Gunicorn configuration
+# Shared by every service: the app is built once in the master
+# (preload) and workers share its memory via fork copy-on-write
+# =========================================================
+#
+# Run from rawasi-backend/:
+#   gunicorn -c gunicorn.conf.py 'model_api:create_app()'
+#   gunicorn -c gunicorn.conf.py -b 0.0.0.0:5001 --chdir Recommendation 'recommendation_api:create_app()'
+#   gunicorn -c gunicorn.conf.py -b 0.0.0.0:5002 --chdir Timeline 'Time:create_app()'
+# or all three from one app:
+#   gunicorn -c gunicorn.conf.py -b 0.0.0.0:8000 'gateway:create_app()'
+
+import gc
+import multiprocessing
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared modules (rawasi-backend/) and the service directories, importable
+# by every app; set here once rather than by the services on import
+pythonpath = ','.join(
+    [BASE_DIR] + [os.path.join(BASE_DIR, service_dir) for service_dir in ('Recommendation', 'Timeline')]
+)
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+# Load models, suppliers and predictors in the master before forking
+preload_app = True
+
+
+def when_ready(server):
+    """Freeze everything loaded so far before workers are forked"""
+    # Objects in the permanent generation are skipped by the collector, so
+    # GC passes in workers don't write to (and un-share) the preloaded pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Start per-process background work registered by the app"""
+    app = server.app.wsgi()
+    for hook in getattr(app, 'extensions', {}).get('post_fork', []):
+        hook()
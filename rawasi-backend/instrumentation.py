@@ -0,0 +1,661 @@
+# =========================================================
+# RAWASI Instrumentation
+# Stage timers, Prometheus metrics, structured logging and an
+# opt-in sampling profiler shared by every service
+# =========================================================
+#
+#   log = get_logger('cost')
+#   log.info("Prediction served", model=name, ms=12.5)
+#
+#   with stage('model_predict'):
+#       ...
+#
+#   instrument_app(app)   # /metrics, /debug/profiler, per-request timing
+#
+# Log records are buffered and written by a background thread, as one JSON
+# object per line (LOG_FORMAT=json, default) or as text (LOG_FORMAT=text).
+# Metrics are per process; under gunicorn each worker reports its own.
+#
+# Set PROFILE_SLOW_MS (or POST /debug/profiler) to sample the stacks of
+# requests in flight every PROFILE_INTERVAL_MS; requests slower than the
+# threshold are written to PROFILE_DIR in collapsed-stack format, ready
+# for flamegraph.pl or speedscope.
+
+import atexit
+import bisect
+import contextvars
+import json
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Records beyond this many waiting to be written are dropped, never blocking a request
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# Seconds between background log writes
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 0.1))
+
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, '.cache', 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 200))
+
+# Token required by /debug/* and /admin/* endpoints (loopback-only when unset)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Histogram bucket upper bounds (seconds)
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# The request being handled (id and accumulated stage times), if any
+_trace = contextvars.ContextVar('rawasi_trace', default=None)
+
+
+# ==================== METRICS ====================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Labelled cumulative histogram in the Prometheus text format"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            labels = dict(zip(self.label_names, label_values))
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                yield f'{self.name}_bucket', dict(labels, le=_format_value(bound)), running
+            yield f'{self.name}_sum', labels, round(total, 6)
+            yield f'{self.name}_count', labels, running
+
+
+class CounterMetric:
+    """Labelled monotonic counter"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, dict(zip(self.label_names, label_values)), value
+
+
+class MetricsRegistry:
+    """
+    Metrics owned by this module plus collectors for other components
+
+    A collector is a callable returning (name, kind, help, samples) tuples,
+    where samples are (sample_name, labels, value) - used for stats that
+    components already keep themselves (e.g. the LLM gateway).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        families = [(m.name, m.kind, m.help, m.samples()) for m in self._metrics]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                get_logger('instrumentation').warning("⚠️ Metrics collector failed", error=str(e))
+        lines = []
+        for name, kind, help_text, samples in families:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+REQUEST_SECONDS = metrics.register(Histogram(
+    'rawasi_request_duration_seconds', 'HTTP request latency',
+    ('service', 'endpoint', 'method', 'status')
+))
+STAGE_SECONDS = metrics.register(Histogram(
+    'rawasi_stage_duration_seconds', 'Time spent in instrumented hot-path stages',
+    ('stage',), STAGE_BUCKETS
+))
+LOG_DROPPED = metrics.register(CounterMetric(
+    'rawasi_log_records_dropped_total', 'Log records dropped because the log queue was full'
+))
+PROFILES_WRITTEN = metrics.register(CounterMetric(
+    'rawasi_profiles_written_total', 'Slow-request stack profiles written', ('endpoint',)
+))
+
+
+# ==================== STAGE TIMERS ====================
+
+class StageTimer:
+    """Context manager timing one stage into STAGE_SECONDS and the current request"""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        trace = _trace.get()
+        if trace is not None:
+            stages = trace['stages']
+            stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+def stage(name):
+    """
+    Time a block as a named stage
+
+    Stages used by the services: dataframe_build, model_predict,
+    supplier_match, llm_call and json_serialize.
+    """
+    return StageTimer(name)
+
+
+_request_counter = itertools.count(1)
+_request_prefix = (None, None)
+
+
+def new_request_id():
+    """Unique request id: a random per-process prefix plus a counter (cheaper than uuid4)"""
+    global _request_prefix
+    pid, prefix = _request_prefix
+    if pid != os.getpid():
+        prefix = uuid.uuid4().hex[:8]
+        _request_prefix = (os.getpid(), prefix)
+    return f'{prefix}{next(_request_counter):08x}'
+
+
+def current_request_id():
+    trace = _trace.get()
+    return trace['id'] if trace is not None else None
+
+
+def run_in_context(executor, fn, *args):
+    """Submit fn to an executor so its stages count towards the current request"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+# ==================== LOGGING ====================
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message and fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with key=value fields"""
+
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to the current sys.stdout, so redirects and test captures apply"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class AsyncHandler(logging.Handler):
+    """
+    Hands records to a background writer without blocking the caller
+
+    emit() only renders the message and appends the record to a deque; a
+    writer thread formats the backlog every flush_interval seconds and
+    writes it in one call. Records beyond maxsize waiting are dropped (and
+    counted). Forked children start their own writer; the backlog they
+    inherit is left to the parent, which still writes it.
+    """
+
+    def __init__(self, target, maxsize=LOG_QUEUE_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        super().__init__()
+        self.target = target
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_writer(self):
+        if self._pid is not None:
+            # Forked (e.g. a gunicorn worker): the parent's writer thread and
+            # any lock it held at fork time didn't come with us
+            self._write_lock = threading.Lock()
+            self._pending = deque()
+        threading.Thread(target=self._write_loop, name='log-writer', daemon=True).start()
+        self._pid = os.getpid()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def handle(self, record):
+        # deque.append is atomic, so no handler lock is taken on the request path
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._ensure_writer()
+        if len(self._pending) >= self.maxsize:
+            LOG_DROPPED.inc()
+            return
+        # Merge args and render tracebacks now; formatting happens in the writer
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = current_request_id()
+        self._pending.append(record)
+
+    def flush(self):
+        """Format and write every pending record"""
+        with self._write_lock:
+            lines = []
+            while self._pending:
+                record = self._pending.popleft()
+                try:
+                    lines.append(self.target.format(record))
+                except Exception:
+                    self.handleError(record)
+            if lines:
+                try:
+                    stream = self.target.stream
+                    stream.write('\n'.join(lines) + '\n')
+                    stream.flush()
+                except Exception:
+                    pass
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Logger taking structured fields as keyword arguments: log.info(msg, key=value)
+
+    Records are built directly (without the caller lookup logging.Logger
+    does), since the structured output doesn't include file and line.
+    """
+
+    def log(self, level, msg, *args, exc_info=None, **fields):
+        logger = self.logger
+        if not logger.isEnabledFor(level):
+            return
+        if exc_info and not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+        record = logger.makeRecord(logger.name, level, '', 0, msg, args, exc_info,
+                                   extra={'fields': fields})
+        logger.handle(record)
+
+    def debug(self, msg, *args, **fields):
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(logging.WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, **fields)
+
+    def exception(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, exc_info=True, **fields)
+
+
+_root_handler = None
+_root_lock = threading.Lock()
+
+
+def _configure_logging():
+    global _root_handler
+    with _root_lock:
+        if _root_handler is not None:
+            return
+        target = StdoutHandler()
+        target.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+        _root_handler = AsyncHandler(target)
+        root = logging.getLogger('rawasi')
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_root_handler)
+        root.propagate = False
+        atexit.register(_root_handler.flush)
+
+
+def get_logger(name):
+    """Structured, non-blocking logger for a service or component"""
+    _configure_logging()
+    return StructuredLogger(logging.getLogger(f'rawasi.{name}'), {})
+
+
+def flush_logs():
+    """Write every queued record now (e.g. before a CLI exits or in tests)"""
+    if _root_handler is not None:
+        _root_handler.flush()
+
+
+# ==================== SAMPLING PROFILER ====================
+
+def _collapsed_stack(frame):
+    """Root-first 'fn (file:line);...' for one frame chain"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of threads handling requests
+
+    A background thread walks sys._current_frames() every interval_ms,
+    but only for threads registered with begin(). end() writes the
+    collected stacks of requests slower than slow_ms to out_dir as
+    collapsed stacks ("frame;frame;frame count" per line). Disabled while
+    slow_ms is 0.
+    """
+
+    def __init__(self, slow_ms=PROFILE_SLOW_MS, interval_ms=PROFILE_INTERVAL_MS,
+                 out_dir=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.out_dir = out_dir
+        self.max_files = max_files
+        self.profiles_written = 0
+        self.last_profile = None
+        self._active = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def enabled(self):
+        return self.slow_ms > 0
+
+    def configure(self, slow_ms=None, interval_ms=None):
+        if slow_ms is not None:
+            self.slow_ms = max(0.0, float(slow_ms))
+        if interval_ms is not None:
+            self.interval_ms = max(0.5, float(interval_ms))
+        return self.describe()
+
+    def _ensure_sampler(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._active = {}
+                threading.Thread(target=self._sample_loop, name='profiler', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval_ms / 1000)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[_collapsed_stack(frame)] += 1
+
+    def begin(self):
+        """Start sampling the calling thread; returns a token for end()"""
+        if not self.enabled:
+            return None
+        self._ensure_sampler()
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = Counter()
+        return ident
+
+    def end(self, token, endpoint, duration_ms):
+        """Stop sampling; returns the profile path if the request was slow"""
+        if token is None:
+            return None
+        with self._lock:
+            stacks = self._active.pop(token, None)
+        if not stacks or not self.enabled or duration_ms < self.slow_ms:
+            return None
+        try:
+            return self._write(stacks, endpoint, duration_ms)
+        except OSError as e:
+            get_logger('instrumentation').warning("⚠️ Could not write profile", error=str(e))
+            return None
+
+    def _write(self, stacks, endpoint, duration_ms):
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_') or 'root'
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(self.out_dir, f'{stamp}-{os.getpid()}-{slug}-{int(duration_ms)}ms.folded')
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+        profiles = sorted(name for name in os.listdir(self.out_dir) if name.endswith('.folded'))
+        for old in profiles[:-self.max_files] if self.max_files > 0 else []:
+            try:
+                os.remove(os.path.join(self.out_dir, old))
+            except OSError:
+                pass
+
+        self.profiles_written += 1
+        self.last_profile = path
+        PROFILES_WRITTEN.inc(endpoint)
+        return path
+
+    def describe(self):
+        return {
+            "enabled": self.enabled,
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval_ms,
+            "out_dir": self.out_dir,
+            "profiles_written": self.profiles_written,
+            "last_profile": self.last_profile
+        }
+
+
+profiler = SamplingProfiler()
+
+
+# ==================== FLASK INTEGRATION ====================
+
+def admin_allowed(request):
+    """True if request may use admin endpoints: X-Admin-Token when ADMIN_TOKEN is set, else loopback only"""
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+def instrument_app(app):
+    """
+    Add request timing, access logs, /metrics and /debug/profiler to an app
+
+    Every request is timed into rawasi_request_duration_seconds (labelled
+    by blueprint, route, method and status) and logged with its stage
+    breakdown. JSON responses are serialized under the json_serialize
+    stage.
+    """
+    from flask import Response, g, jsonify, request
+    from flask.json.provider import DefaultJSONProvider
+
+    log = get_logger('http')
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with stage('json_serialize'):
+                return super().dumps(obj, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_trace():
+        trace = {'id': request.headers.get('X-Request-ID') or new_request_id(), 'stages': {}}
+        # [trace, context token, profiler token, start]; one g entry keeps the hooks cheap
+        g.rawasi = [trace, _trace.set(trace), profiler.begin(), time.perf_counter()]
+
+    @app.after_request
+    def finish_trace(response):
+        state = g.get('rawasi')
+        if state is None:
+            return response
+        trace, _, profile_token, start = state
+        elapsed = time.perf_counter() - start
+        req = request._get_current_object()
+        endpoint = req.url_rule.rule if req.url_rule else 'unmatched'
+        status = response.status_code
+        if endpoint != '/metrics':
+            REQUEST_SECONDS.observe(elapsed, req.blueprint or 'app', endpoint, req.method, str(status))
+        state[2] = None
+        profile = profiler.end(profile_token, endpoint, elapsed * 1000)
+        response.headers['X-Request-ID'] = trace['id']
+
+        fields = {
+            'endpoint': endpoint,
+            'status': status,
+            'ms': round(elapsed * 1000, 2),
+            'stages_ms': {name: round(seconds * 1000, 3) for name, seconds in trace['stages'].items()}
+        }
+        if profile:
+            fields['profile'] = profile
+        log.info(f"{req.method} {req.path} {status}", **fields)
+        return response
+
+    @app.teardown_request
+    def reset_trace(exc):
+        state = g.pop('rawasi', None)
+        if state is not None:
+            _trace.reset(state[1])
+            # Requests that failed before after_request still stop sampling
+            profiler.end(state[2], 'error', 0)
+
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    def profiler_endpoint():
+        """GET: profiler settings. POST {"slow_ms": 500, "interval_ms": 5} to enable, {"slow_ms": 0} to disable"""
+        if not admin_allowed(request):
+            return jsonify({"success": False, "error": "Unauthorized"}), 401
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            try:
+                settings = profiler.configure(data.get('slow_ms'), data.get('interval_ms'))
+            except (TypeError, ValueError) as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+            log.info("🔬 Profiler configured", **settings)
+        return jsonify(dict(profiler.describe(), success=True, pid=os.getpid()))
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
+    app.add_url_rule('/debug/profiler', 'debug_profiler', profiler_endpoint, methods=['GET', 'POST'])
+    return app
@@ -0,0 +1,400 @@
+# =========================================================
+# RAWASI LLM Gateway
+# Shared, bounded access to the Gemini models for every service
+# =========================================================
+#
+# Every generate_content call goes through one process-wide gateway that
+# caps concurrent upstream calls, enforces a per-call timeout, retries
+# with jittered backoff and trips a per-model circuit breaker so callers
+# fail fast to their rule-based fallbacks while the upstream is down.
+#
+# Set LLM_BACKEND=stub to run every service against StubModel (no API key
+# or network needed), e.g. for benchmarks.
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from instrumentation import metrics, stage
+
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 5))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))
+LLM_RETRIES = int(os.getenv('LLM_RETRIES', 2))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', 0.5))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', 30))
+
+# Latency histogram bucket upper bounds (seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+class LLMError(Exception):
+    """An LLM call did not produce a response"""
+
+
+class LLMTimeout(LLMError):
+    """The upstream model did not answer within the call timeout"""
+
+
+class LLMBusy(LLMError):
+    """No concurrency slot became free within LLM_QUEUE_TIMEOUT"""
+
+
+class CircuitOpen(LLMError):
+    """The model's circuit breaker is open; callers should use their fallback"""
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        """Cumulative bucket counts keyed by upper bound, plus count and sum"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip([str(b) for b in self.buckets] + ['+Inf'], counts):
+            running += bucket_count
+            cumulative[bound] = running
+        return {"buckets": cumulative, "count": count, "sum": round(total, 6)}
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    Opens after failure_threshold consecutive failures. While open, calls
+    are rejected until reset_timeout has passed; then a single trial call
+    is let through (half-open) and its outcome closes or re-opens the
+    circuit. A trial that never reports back is given up on after another
+    reset_timeout, and a new one is let through.
+    """
+
+    def __init__(self, failure_threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def ready(self):
+        """True if allow() would let a call through now (without claiming the trial)"""
+        with self._lock:
+            return self._due(time.monotonic())
+
+    def allow(self):
+        """True if a call may go upstream; the caller must then record its outcome"""
+        with self._lock:
+            now = time.monotonic()
+            if not self._due(now):
+                return False
+            if self.state != 'closed':
+                self.state = 'half_open'
+                self.trial_started = now
+            return True
+
+    def _due(self, now):
+        if self.state == 'closed':
+            return True
+        if self.state == 'open':
+            return now - self.opened_at >= self.reset_timeout
+        return now - self.trial_started >= self.reset_timeout  # stale half-open trial
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def describe(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "trips": self.trips}
+
+
+class LLMResponse:
+    """Minimal stand-in for a generate_content response"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def stub_responder(contents):
+    """Canned answers shaped like the real prompts expect"""
+    prompt = contents if isinstance(contents, str) else ' '.join(c for c in contents if isinstance(c, str))
+    if 'construction timeline' in prompt:
+        return "12.0"
+    if 'SUPPLIER RECOMMENDATION INSIGHTS' in prompt:
+        return json.dumps({
+            "summary": "Stub insights.",
+            "key_advantages": ["Stub advantage"],
+            "potential_risks": ["Stub risk"],
+            "recommendations": "Stub recommendation."
+        })
+    return "Complexity Score: 5/10\nExplanation: Stub analysis."
+
+
+class StubModel:
+    """
+    Local model for tests and benchmarks
+
+    Parameters:
+    - responder: callable(contents) -> text (default: stub_responder)
+    - delay: seconds to sleep per call, to simulate upstream latency
+    """
+
+    def __init__(self, responder=stub_responder, delay=0.0):
+        self.responder = responder
+        self.delay = delay
+        self.calls = 0
+
+    def generate_content(self, contents):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return LLMResponse(self.responder(contents))
+
+
+class ModelStats:
+    """Call counters and latency histogram for one model"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ('calls', 'successes', 'failures', 'timeouts', 'retries', 'rejected', 'busy'), 0
+        )
+        self.latency = LatencyHistogram()
+
+    def increment(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters['latency_seconds'] = self.latency.snapshot()
+        return counters
+
+
+class LLMGateway:
+    """
+    Process-wide gateway in front of the generative models
+
+    Parameters:
+    - backend: 'gemini' (needs GEMINI_API_KEY) or 'stub'
+    - max_concurrency: upstream calls in flight at once
+    - queue_timeout: seconds to wait for a free slot before LLMBusy
+    - timeout: default per-attempt timeout in seconds
+    - retries: extra attempts after a failed or timed-out call
+    - backoff: base for full-jitter exponential backoff between attempts
+    """
+
+    def __init__(self, backend=LLM_BACKEND, max_concurrency=LLM_MAX_CONCURRENCY,
+                 queue_timeout=LLM_QUEUE_TIMEOUT, timeout=LLM_TIMEOUT,
+                 retries=LLM_RETRIES, backoff=LLM_RETRY_BACKOFF):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._lock = threading.Lock()
+        self._models = {}
+        self._breakers = {}
+        self._stats = {}
+        self._configured = False
+        self._stub = None
+
+    @property
+    def enabled(self):
+        """True if calls can reach a model (API key configured, or stub backend)"""
+        return self.backend == 'stub' or bool(os.getenv('GEMINI_API_KEY'))
+
+    def use_stub(self, model=None):
+        """Route every model name to a StubModel (for tests and benchmarks)"""
+        with self._lock:
+            self.backend = 'stub'
+            self._stub = model or StubModel()
+            self._models.clear()
+        return self._stub
+
+    def _model(self, model_name):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                if self.backend == 'stub':
+                    model = self._stub = self._stub or StubModel()
+                else:
+                    import google.generativeai as genai
+                    if not self._configured:
+                        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+                        self._configured = True
+                    model = genai.GenerativeModel(model_name)
+                self._models[model_name] = model
+                self._breakers.setdefault(model_name, CircuitBreaker())
+                self._stats.setdefault(model_name, ModelStats())
+            return model
+
+    def client(self, model_name, timeout=None):
+        """Model handle whose generate_content goes through the gateway"""
+        self._model(model_name)
+        return LLMClient(self, model_name, timeout)
+
+    def generate(self, model_name, contents, timeout=None):
+        """
+        Call model_name with contents under the gateway's limits
+
+        Returns:
+        - response object with a .text attribute
+
+        Raises:
+        - CircuitOpen, LLMBusy, LLMTimeout, or the last upstream error
+        """
+        model = self._model(model_name)
+        breaker, stats = self._breakers[model_name], self._stats[model_name]
+        timeout = timeout or self.timeout
+        stats.increment('calls')
+
+        def reject():
+            stats.increment('rejected')
+            return CircuitOpen(f"Circuit open for {model_name}; using fallback")
+
+        # Fail fast without queueing for a slot while the circuit is open
+        if not breaker.ready():
+            raise reject()
+
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.increment('retries')
+                time.sleep(random.uniform(0, self.backoff * (2 ** (attempt - 1))))
+
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                stats.increment('busy')
+                raise LLMBusy(f"No free LLM slot within {self.queue_timeout:g}s")
+
+            # Claimed only once a slot is held, so a half-open trial always runs
+            if not breaker.allow():
+                self._slots.release()
+                if last_error is None:
+                    raise reject()
+                break
+
+            start = time.perf_counter()
+            succeeded = False
+            try:
+                try:
+                    future = self._executor.submit(model.generate_content, contents)
+                except BaseException:
+                    self._slots.release()
+                    raise
+                # The slot is held until the upstream call really ends, even after a timeout
+                future.add_done_callback(lambda _: self._slots.release())
+
+                try:
+                    response = future.result(timeout=timeout)
+                except FutureTimeout:
+                    stats.increment('timeouts')
+                    last_error = LLMTimeout(f"{model_name} did not answer within {timeout:g}s")
+                except Exception as e:
+                    last_error = e
+                else:
+                    succeeded = True
+            finally:
+                # Every admitted call reports back, so a half-open trial can't be left hanging
+                if succeeded:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+
+            if succeeded:
+                stats.latency.observe(time.perf_counter() - start)
+                stats.increment('successes')
+                return response
+            stats.increment('failures')
+
+        raise last_error
+
+    def metric_families(self):
+        """Gateway stats as Prometheus metric families (see instrumentation.MetricsRegistry)"""
+        models = self.stats()['models']
+        calls, latency, breaker_open = [], [], []
+        for name, model_stats in sorted(models.items()):
+            for outcome, value in model_stats.items():
+                if isinstance(value, int):
+                    calls.append(('rawasi_llm_calls_total', {'model': name, 'outcome': outcome}, value))
+            histogram = model_stats['latency_seconds']
+            for bound, count in histogram['buckets'].items():
+                latency.append(('rawasi_llm_latency_seconds_bucket', {'model': name, 'le': bound}, count))
+            latency.append(('rawasi_llm_latency_seconds_sum', {'model': name}, histogram['sum']))
+            latency.append(('rawasi_llm_latency_seconds_count', {'model': name}, histogram['count']))
+            breaker_open.append(('rawasi_llm_breaker_open', {'model': name},
+                                 int(model_stats['breaker']['state'] != 'closed')))
+        return [
+            ('rawasi_llm_calls_total', 'counter', 'LLM gateway calls by outcome', calls),
+            ('rawasi_llm_latency_seconds', 'histogram', 'Successful upstream LLM call latency', latency),
+            ('rawasi_llm_breaker_open', 'gauge', '1 while the model circuit breaker is open or half-open', breaker_open),
+        ]
+
+    def stats(self):
+        """Per-model counters, latency histograms and breaker state"""
+        with self._lock:
+            names = list(self._stats)
+        return {
+            "backend": self.backend,
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "retries": self.retries,
+            "models": {
+                name: dict(self._stats[name].snapshot(), breaker=self._breakers[name].describe())
+                for name in names
+            }
+        }
+
+
+class LLMClient:
+    """Drop-in for GenerativeModel.generate_content routed through a gateway"""
+
+    def __init__(self, gateway, model_name, timeout=None):
+        self.gateway = gateway
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def generate_content(self, contents):
+        with stage('llm_call'):
+            return self.gateway.generate(self.model_name, contents, timeout=self.timeout)
+
+
+gateway = LLMGateway()
+metrics.add_collector(gateway.metric_families)
@@ -0,0 +1,162 @@
+# =========================================================
+# RAWASI Location Index
+# Saudi regions and cities by Arabic/English name for O(1) lookup
+# =========================================================
+#
+# Built once from saudi_locations.json and shared by the cost model
+# (location -> macro_region/city features) and supplier matching
+# (location -> Central/Eastern/Western/Southern/Northern zone).
+
+import json
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCATIONS_PATH = os.getenv('LOCATIONS_PATH', os.path.join(BASE_DIR, 'saudi_locations.json'))
+
+# Distinct input strings remembered per lookup
+LOOKUP_CACHE_SIZE = 4096
+
+# City feature the cost models were trained with when only the region is known
+UNKNOWN_CITY = 'Unknown'
+
+# A region or city; model_region is its (macro_region, city) cost model features
+Location = namedtuple('Location', ['name', 'name_ar', 'region', 'region_ar', 'zone', 'model_region'])
+
+# Arabic letter variants folded together, diacritics and tatweel dropped
+_ARABIC_FOLD = str.maketrans(
+    {'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ة': 'ه', 'ى': 'ي', 'ـ': None,
+     **{chr(c): None for c in range(0x064B, 0x0653)}}
+)
+_SEPARATORS = re.compile(r"[\s\-_.]+")
+_QUOTES = re.compile(r"['’`ʼ]")
+# Splits multi-part text such as "Jeddah, Makkah" or "Eastern / Central"
+_PARTS = re.compile(r"\s*[,،/|;&]\s*|\s+and\s+")
+# English transliterations of the Arabic article, e.g. Al Khobar, Ad Dammam, At Taif
+_ARTICLE = re.compile(r"^(?:al|el|ar|as|ad|az|ash|at|an|adh|ath) ")
+_SUFFIX = re.compile(r" (?:city|province|region|governorate)$")
+
+
+def normalize_name(text):
+    """Lowercased, whitespace-collapsed, Arabic-folded form of a place name"""
+    text = _QUOTES.sub('', str(text).translate(_ARABIC_FOLD).lower())
+    return _SEPARATORS.sub(' ', text).strip()
+
+
+def _variants(key):
+    """Keys a name is also found under: without the article or a trailing 'city'/'region'"""
+    variants = []
+    for candidate in (key, _SUFFIX.sub('', key)):
+        variants.append(candidate)
+        if _ARTICLE.match(candidate):
+            variants.append(_ARTICLE.sub('', candidate))
+        elif candidate.startswith('ال') and len(candidate) > 4:
+            variants.append(candidate[2:])
+        elif candidate.startswith('al') and len(candidate) > 5:
+            variants.append(candidate[2:])  # "Alkhobar"
+    return variants
+
+
+class LocationIndex:
+    """
+    Every Saudi region and city keyed by its normalized names
+
+    Parameters:
+    - data: parsed saudi_locations.json: "regions" (each with its Arabic
+      name, zone, aliases and cities), "zones" (zone -> aliases) and
+      "nationwide" aliases
+
+    Cities take precedence over regions sharing a name (e.g. "Tabuk").
+    Names are matched exactly after normalization, first as given and
+    then without the article ("Al Khobar" / "Khobar", "الخبر" / "خبر"),
+    so a lookup is a few dict probes, memoized per input string.
+    """
+
+    def __init__(self, data):
+        self.locations = []
+        self.zone_names = tuple(data['zones'])
+        self._zones = {normalize_name(alias): zone
+                       for zone, aliases in data['zones'].items() for alias in [zone] + aliases}
+        self._nationwide = frozenset(normalize_name(alias) for alias in data['nationwide'])
+
+        city_names, region_names, regions = [], [], []  # (name, location) pairs
+        for region in data['regions']:
+            region_location = Location(region['name'], region['name_ar'], region['name'], region['name_ar'],
+                                       region['zone'], (region['name_ar'], UNKNOWN_CITY))
+            regions.append(region_location)
+            for alias in [region['name'], region['name_ar']] + region.get('aliases', []):
+                region_names.append((alias, region_location))
+            for city in region['cities']:
+                location = Location(city['name'], city['name_ar'], region['name'], region['name_ar'], region['zone'],
+                                    (city.get('macro_region', region['name_ar']), city['name_ar']))
+                self.locations.append(location)
+                for alias in [city['name'], city['name_ar']] + city.get('aliases', []):
+                    city_names.append((alias, location))
+        self.locations.extend(regions)
+        names = city_names + region_names  # cities win name clashes
+
+        # Exact names before article-less variants, so "Al Ula" never loses to a bare "Ula"
+        self._names = {}
+        for alias, location in names:
+            self._names.setdefault(normalize_name(alias), location)
+        for alias, location in names:
+            for variant in _variants(normalize_name(alias)):
+                self._names.setdefault(variant, location)
+
+        self.resolve = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._resolve)
+        self.zones_in = lru_cache(maxsize=LOOKUP_CACHE_SIZE)(self._zones_in)
+
+    @classmethod
+    def load(cls, path=LOCATIONS_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def _lookup(self, key):
+        for variant in _variants(key):
+            location = self._names.get(variant)
+            if location is not None:
+                return location
+        return None
+
+    def _resolve(self, text):
+        """
+        Location for a city or region name, or None
+
+        Multi-part text ("Al Khobar, Eastern Province") resolves to its
+        first known part.
+        """
+        key = normalize_name(text)
+        location = self._lookup(key)
+        if location is None:
+            for part in _PARTS.split(key):
+                location = self._lookup(part)
+                if location is not None:
+                    break
+        return location
+
+    def _zones_in(self, text):
+        """
+        Frozenset of zones named or implied by free text
+
+        Parts may be zones ("Eastern, Central"), places ("Riyadh") or
+        nationwide ("All regions", every zone). Parts that match nothing
+        are tried word by word ("Eastern Central").
+        """
+        zones = set()
+        for part in _PARTS.split(normalize_name(text)):
+            for candidate in [part] + ([] if self._match_zone(part) else part.split(' ')):
+                zones |= self._match_zone(candidate)
+        return frozenset(zones)
+
+    def _match_zone(self, key):
+        if key in self._nationwide:
+            return set(self.zone_names)
+        if key in self._zones:
+            return {self._zones[key]}
+        location = self._lookup(key) if key else None
+        return {location.zone} if location is not None else set()
+
+
+locations = LocationIndex.load()
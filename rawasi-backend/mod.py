@@ -3,25 +3,26 @@
 # Serves the trained Ridge model for cost predictions
 # =========================================================
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
 import joblib
 import os
 from datetime import datetime, timedelta
+from model_registry import ensure_pickle_symbols
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React frontend
+bp = Blueprint('cost', __name__)
 
 # Load the trained model bundle
-MODEL_PATH = "rawasi_model/rawasi_lin_logbundle.pkl"
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rawasi_model", "rawasi_lin_logbundle.pkl")
 bundle = None
 
 def load_model():
     """Load the model bundle on startup"""
     global bundle
     try:
+        ensure_pickle_symbols()  # Bundle references __main__.log1p_array
         bundle = joblib.load(MODEL_PATH)
         print(f"✅ Model loaded successfully from {MODEL_PATH}")
         return True
@@ -131,7 +132,22 @@ def predict_cost_from_inputs(
             "error": str(e)
         }
 
-@app.route('/health', methods=['GET'])
+def create_app():
+    """
+    Application factory (gunicorn -c gunicorn.conf.py 'mod:create_app()')
+    
+    With preload_app the bundle is loaded once in the gunicorn master and
+    shared with workers through fork copy-on-write.
+    """
+    if bundle is None and not load_model():
+        raise RuntimeError("Failed to load model. Please ensure the model file exists.")
+    
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for React frontend
+    app.register_blueprint(bp)
+    return app
+
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -139,7 +155,7 @@ def health_check():
         "model_loaded": bundle is not None
     })
 
-@app.route('/predict', methods=['POST'])
+@bp.route('/predict', methods=['POST'])
 def predict():
     """
     Prediction endpoint
@@ -188,7 +204,7 @@ def predict():
             "error": str(e)
         }), 500
 
-@app.route('/batch-predict', methods=['POST'])
+@bp.route('/batch-predict', methods=['POST'])
 def batch_predict():
     """
     Batch prediction endpoint for multiple projects
@@ -242,6 +258,6 @@ if __name__ == '__main__':
     # Load model on startup
     if load_model():
         # Run the Flask app
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        create_app().run(host='0.0.0.0', port=5000, debug=True)
     else:
         print("❌ Failed to load model. Please ensure the model file exists.")
\ No newline at end of file
@@ -3,20 +3,38 @@
 # Serves the trained Ridge model for cost predictions
 # =========================================================
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify
 from flask_cors import CORS
+from werkzeug.wsgi import get_input_stream
 import numpy as np
 import pandas as pd
-import joblib
+import json
 import os
+import time
 from datetime import datetime, timedelta
+from cost_bulk import BULK_FORMATS, BULK_MAX_BYTES, BulkTooLarge, iter_bulk, spool_body
+from cost_engine import map_sector, map_location, build_result, score_projects
+from cost_sweep import CostSweep
+from instrumentation import admin_allowed, get_logger, instrument_app
+from model_registry import ModelRegistry
+from ttl_cache import TTLCache
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React frontend
+bp = Blueprint('cost', __name__)
+log = get_logger('cost')
 
-# Load the trained model bundle
-MODEL_PATH = "rawasi_model/rawasi_lin_logbundle.pkl"
-bundle = None
+# Registry of every trained cost model (rawasi_model/*.pkl), default is the Ridge log bundle
+registry = ModelRegistry()
+
+# Optional model scored in the background on every /predict for comparison
+SHADOW_MODEL = os.getenv('SHADOW_MODEL')
+
+# Memoized predictions keyed on canonical model inputs
+CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_SIZE', 4096))
+CACHE_TTL_SECONDS = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+prediction_cache = TTLCache(maxsize=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+
+# Cached costs belong to the previous bundles once any model is swapped
+registry.add_listener(lambda names: prediction_cache.clear())
 
 # IMPORTANT: Define the log1p_array function (needed for unpickling the model)
 def log1p_array(X):
@@ -24,16 +42,38 @@ def log1p_array(X):
     return np.log1p(X)
 
 def load_model():
-    """Load the model bundle on startup"""
-    global bundle
+    """Load every registered model bundle on startup"""
     try:
-        bundle = joblib.load(MODEL_PATH)
-        print(f"✅ Model loaded successfully from {MODEL_PATH}")
+        loaded = registry.load_all()
+        if registry.get() is None:
+            log.error(f"❌ Default model '{registry.default}' is not available", default_model=registry.default)
+            return False
+        log.info(f"✅ {loaded} model(s) loaded", loaded=loaded, default_model=registry.default)
         return True
     except Exception as e:
-        print(f"❌ Error loading model: {e}")
+        log.exception("❌ Error loading model", error=str(e))
         return False
 
+def _model_error(model_name):
+    """Error body and status for a model selector that didn't resolve"""
+    if model_name:
+        return {"success": False, "error": f"Unknown model: {model_name}"}, 400
+    return {"success": False, "error": "Model not loaded"}, 500
+
+def _resolve_model(model_name):
+    """
+    Look up the model a request asked for
+    
+    Returns:
+    - (entry, None), or (None, (error response, status)) for an unknown
+      model or when the default model isn't loaded
+    """
+    entry = registry.get(model_name)
+    if entry is None:
+        body, status = _model_error(model_name)
+        return None, (jsonify(body), status)
+    return entry, None
+
 def _to_date(date_str):
     """Convert date string to datetime"""
     try:
@@ -46,7 +86,9 @@ def predict_cost_from_inputs(
     size_sqm: float,
     location: str,
     timeline_months: int,
-    rate_sar_m2: float = 750.0  # Default rate
+    rate_sar_m2: float = 750.0,  # Default rate
+    model_name: str = None,
+    shadow_model: str = None
 ) -> dict:
     """
     Predict project cost based on user inputs
@@ -57,78 +99,56 @@ def predict_cost_from_inputs(
     - location: City/Region (e.g., "Riyadh", "Jeddah")
     - timeline_months: Expected timeline in months
     - rate_sar_m2: Cost per square meter (default: 750 SAR/m²)
+    - model_name: Registered model name, version or name@version (default model if omitted)
+    - shadow_model: Model to score in the background for comparison (default: SHADOW_MODEL)
     
     Returns:
     - Dictionary with prediction results
     """
-    if bundle is None:
-        return {"error": "Model not loaded"}
+    entry = registry.get(model_name)
+    if entry is None:
+        return _model_error(model_name)[0]
     
     try:
-        # Map project type to sectors
-        sector_mapping = {
-            "Residential": "سكني",
-            "Commercial": "تجاري",
-            "Industrial": "صناعي",
-            "Mixed-Use": "مختلط"
-        }
-        sectors = sector_mapping.get(project_type, "سكني")
+        # Map project type to sectors and location to macro_region/city
+        sectors = map_sector(project_type)
+        macro_region, city = map_location(location)
         
         # Calculate duration in days
         duration_days = timeline_months * 30
         
-        # Prepare region text (simplified - you may need to adjust based on your data)
-        region_mapping = {
-            "Riyadh": "منطقة الرياض, الرياض",
-            "Jeddah": "منطقة مكة المكرمة, جدة",
-            "Dammam": "المنطقة الشرقية, الدمام",
-            "Mecca": "منطقة مكة المكرمة, مكة المكرمة",
-            "Medina": "منطقة المدينة المنورة, المدينة المنورة"
-        }
-        region_text = region_mapping.get(location, "منطقة الرياض, الرياض")
+        # Canonical cache key: model version plus the exact mapped features, so e.g.
+        # "Jeddah" and "جدة" share an entry while the cost stays identical to /batch-predict
+        model_size = float(size_sqm)
+        model_rate = float(rate_sar_m2)
+        cache_key = (entry.name, entry.version, sectors, macro_region, city,
+                     model_size, model_rate, float(duration_days))
         
-        # Split region into macro_region and city
-        if ',' in region_text:
-            macro_region, city = [x.strip() for x in region_text.split(',', 1)]
-        else:
-            macro_region, city = region_text, 'Unknown'
-        
-        # Create input DataFrame
-        input_data = pd.DataFrame([{
+        row = {
             'sectors': sectors,
             'macro_region': macro_region,
             'city': city,
-            'area_project_imputed_m2': float(size_sqm),
-            'rate_used_sar_m2': float(rate_sar_m2),
+            'area_project_imputed_m2': model_size,
+            'rate_used_sar_m2': model_rate,
             'duration_days': float(duration_days)
-        }])
+        }
         
-        # Make prediction
-        model = bundle['model']
-        pred_log = model.predict(input_data)[0]
-        pred_cost = np.expm1(pred_log)
-        pred_cost = float(max(pred_cost, 0.0))
+        pred_cost = prediction_cache.get(cache_key)
+        if pred_cost is None:
+            # Make prediction (compiled kernel when available, else the sklearn pipeline)
+            pred_cost = entry.predict_cost(row)
+            prediction_cache.set(cache_key, pred_cost)
         
-        # Calculate confidence interval (rough estimate based on ±15% variation)
-        confidence_lower = pred_cost * 0.85
-        confidence_upper = pred_cost * 1.15
+        # Score the shadow model off the request path
+        shadow_name = shadow_model or SHADOW_MODEL
+        if shadow_name:
+            shadow_entry = registry.get(shadow_name)
+            if shadow_entry is not None and shadow_entry is not entry:
+                registry.shadow(shadow_entry, entry, row, pred_cost)
         
-        return {
-            "success": True,
-            "predicted_cost": round(pred_cost, 2),
-            "confidence_interval": {
-                "lower": round(confidence_lower, 2),
-                "upper": round(confidence_upper, 2)
-            },
-            "cost_per_sqm": round(pred_cost / size_sqm, 2),
-            "inputs": {
-                "project_type": project_type,
-                "size_sqm": size_sqm,
-                "location": location,
-                "timeline_months": timeline_months,
-                "rate_sar_m2": rate_sar_m2
-            }
-        }
+        result = build_result(pred_cost, project_type, size_sqm, location, timeline_months, rate_sar_m2)
+        result["model"] = {"name": entry.name, "version": entry.version}
+        return result
         
     except Exception as e:
         return {
@@ -136,15 +156,80 @@ def predict_cost_from_inputs(
             "error": str(e)
         }
 
-@app.route('/health', methods=['GET'])
+def init_service():
+    """
+    Load every model bundle once
+    
+    Returns:
+    - List of hooks to run in each forked worker
+    """
+    if registry.get() is None and not load_model():
+        raise RuntimeError("Failed to load model. Please ensure the model file exists.")
+    # Threads don't survive fork, so each worker starts its own model watcher
+    return [registry.start_watcher]
+
+def create_app():
+    """
+    Application factory
+    
+    Loads every model bundle once. Under gunicorn with preload_app (see
+    gunicorn.conf.py) this runs in the master, so workers share the loaded
+    models through fork copy-on-write instead of unpickling their own.
+    
+    Usage: gunicorn -c gunicorn.conf.py 'model_api:create_app()'
+    """
+    post_fork = init_service()
+    
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for React frontend
+    app.register_blueprint(bp)
+    instrument_app(app)
+    app.extensions['post_fork'] = post_fork
+    return app
+
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
-        "model_loaded": bundle is not None
+        "model_loaded": registry.get() is not None,
+        "models": registry.names(),
+        "default_model": registry.default,
+        "fast_path_disabled": registry.fast_path_errors(),
+        "prediction_cache": prediction_cache.stats()
     })
 
-@app.route('/predict', methods=['POST'])
+@bp.route('/models', methods=['GET'])
+def list_models():
+    """Registered models with versions, per-model latency and shadow comparisons"""
+    return jsonify(registry.describe())
+
+@bp.route('/admin/reload', methods=['POST'])
+def reload_models():
+    """
+    Hot reload model bundles that changed on disk
+    
+    Optional JSON body:
+    {
+        "model": "ridge_log",  // reload a single model
+        "force": true          // reload even if the file is unchanged
+    }
+    """
+    if not admin_allowed(request):
+        return jsonify({"success": False, "error": "Unauthorized"}), 401
+    
+    data = request.get_json(silent=True) or {}
+    names = [data['model']] if data.get('model') else None
+    results = registry.reload(names, force=bool(data.get('force')))
+    failed = any(status.startswith('error') for status in results.values())
+    
+    return jsonify({
+        "success": not failed,
+        "results": results,
+        "models": [entry.describe() for entry in map(registry.get, registry.names())]
+    }), 500 if failed else 200
+
+@bp.route('/predict', methods=['POST'])
 def predict():
     """
     Prediction endpoint
@@ -155,7 +240,9 @@ def predict():
         "size_sqm": 1500,
         "location": "Riyadh",
         "timeline_months": 12,
-        "rate_sar_m2": 750  // optional
+        "rate_sar_m2": 750,  // optional
+        "model": "linreg_boosted",  // optional, name, version or name@version
+        "shadow_model": "ridge_log"  // optional
     }
     """
     try:
@@ -173,13 +260,19 @@ def predict():
         # Get optional rate or use default
         rate_sar_m2 = data.get('rate_sar_m2', 750.0)
         
+        _, error = _resolve_model(data.get('model'))
+        if error:
+            return error
+        
         # Make prediction
         result = predict_cost_from_inputs(
             project_type=data['project_type'],
             size_sqm=float(data['size_sqm']),
             location=data['location'],
             timeline_months=int(data['timeline_months']),
-            rate_sar_m2=float(rate_sar_m2)
+            rate_sar_m2=float(rate_sar_m2),
+            model_name=data.get('model'),
+            shadow_model=data.get('shadow_model')
         )
         
         if result.get('success'):
@@ -188,12 +281,13 @@ def predict():
             return jsonify(result), 500
             
     except Exception as e:
+        log.exception("❌ Error in predict endpoint", error=str(e))
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
-@app.route('/batch-predict', methods=['POST'])
+@bp.route('/batch-predict', methods=['POST'])
 def batch_predict():
     """
     Batch prediction endpoint for multiple projects
@@ -208,7 +302,8 @@ def batch_predict():
                 "timeline_months": 12
             },
             ...
-        ]
+        ],
+        "model": "ridge_log"  // optional
     }
     """
     try:
@@ -221,23 +316,149 @@ def batch_predict():
                 "error": "No projects provided"
             }), 400
         
-        results = []
-        for project in projects:
-            result = predict_cost_from_inputs(
-                project_type=project.get('project_type', 'Residential'),
-                size_sqm=float(project.get('size_sqm', 1500)),
-                location=project.get('location', 'Riyadh'),
-                timeline_months=int(project.get('timeline_months', 12)),
-                rate_sar_m2=float(project.get('rate_sar_m2', 750))
-            )
-            results.append(result)
+        entry, error = _resolve_model(data.get('model'))
+        if error:
+            return error
+        
+        # Validate and score every project in one vectorized pass
+        start = time.perf_counter()
+        results = score_projects(entry.predictor, projects, target=entry.target)
+        entry.batch_latency.record(time.perf_counter() - start)
         
         return jsonify({
             "success": True,
+            "model": {"name": entry.name, "version": entry.version},
             "predictions": results
         }), 200
         
     except Exception as e:
+        log.exception("❌ Error in batch-predict endpoint", error=str(e))
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@bp.route('/batch-predict/stream', methods=['POST'])
+def batch_predict_stream():
+    """
+    Bulk prediction for large project files, streamed
+    
+    Request body: one project per line as NDJSON (the same fields as
+    /batch-predict projects), or CSV with a header row when Content-Type
+    is text/csv.
+    
+    Query parameters (optional):
+    - model: name, version or name@version
+    - format: 'ndjson' or 'csv' output (default: the input format)
+    
+    Every result carries its row "index"; rows that fail validation come
+    back with "success": false instead of failing the request. The body is
+    spooled (to disk past 1 MB) before scoring starts, because most
+    clients upload the whole body before reading any of the response.
+    """
+    try:
+        input_format = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        output_format = request.args.get('format', input_format)
+        if output_format not in BULK_FORMATS:
+            return jsonify({"success": False, "error": f"Unknown format: {output_format}"}), 400
+        
+        entry, error = _resolve_model(request.args.get('model'))
+        if error:
+            return error
+        
+        # Read past the app-wide MAX_CONTENT_LENGTH, up to the bulk limit
+        try:
+            body = spool_body(get_input_stream(request.environ, max_content_length=BULK_MAX_BYTES))
+        except BulkTooLarge as e:
+            return jsonify({"success": False, "error": str(e)}), 413
+        
+        log.info("📥 Bulk prediction", input_format=input_format, output_format=output_format, model=entry.name)
+        results = iter_bulk(entry.predictor, body, input_format, output_format, target=entry.target)
+        
+        def stream():
+            # The status line is already sent, so a failure can only end the stream
+            try:
+                yield from results
+            except Exception as e:
+                log.exception("❌ Bulk prediction failed mid-stream", error=str(e))
+                if output_format == 'ndjson':
+                    yield json.dumps({"success": False, "error": str(e)}) + '\n'
+        
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        return Response(stream(), mimetype=mimetype, headers={
+            'X-Model': f"{entry.name}@{entry.version}"
+        })
+        
+    except Exception as e:
+        log.exception("❌ Error in batch-predict/stream endpoint", error=str(e))
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@bp.route('/predict/sweep', methods=['POST'])
+def predict_sweep():
+    """
+    Score every combination of parameter ranges, streamed
+    
+    Expected JSON body:
+    {
+        "grid": {
+            "project_type": ["Residential", "Commercial"],   // value or list
+            "location": "Riyadh",
+            "size_sqm": {"start": 500, "stop": 5000, "step": 500},  // inclusive stop
+            "timeline_months": [6, 12, 18, 24],
+            "rate_sar_m2": {"start": 600, "stop": 1200, "num": 13}
+        },
+        "model": "ridge_log",  // optional
+        "format": "columnar"   // or "ndjson" (default when Accept is application/x-ndjson)
+    }
+    
+    Missing axes use the /batch-predict defaults. "columnar" returns one
+    JSON object with the grid axes and a flat predicted_cost list in grid
+    order; "ndjson" sends a header line and then one prediction per line.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Expected a JSON object"}), 400
+        
+        default_format = 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'columnar'
+        output_format = data.get('format', default_format)
+        if output_format not in ('columnar', 'ndjson'):
+            return jsonify({"success": False, "error": f"Unknown format: {output_format}"}), 400
+        
+        try:
+            sweep = CostSweep(data.get('grid', {}))
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        entry, error = _resolve_model(data.get('model'))
+        if error:
+            return error
+        
+        log.info("📥 Cost sweep", points=sweep.size, format=output_format, model=entry.name)
+        model_info = {"name": entry.name, "version": entry.version}
+        if output_format == 'ndjson':
+            body = sweep.iter_ndjson(entry.predictor, entry.target, model=model_info)
+            mimetype = 'application/x-ndjson'
+        else:
+            body = sweep.iter_columnar(entry.predictor, entry.target, model=model_info)
+            mimetype = 'application/json'
+        
+        def stream():
+            # The status line is already sent, so a failure can only end the stream
+            try:
+                yield from body
+            except Exception as e:
+                log.exception("❌ Cost sweep failed mid-stream", error=str(e))
+                if output_format == 'ndjson':
+                    yield json.dumps({"success": False, "error": str(e)}) + '\n'
+        
+        return Response(stream(), mimetype=mimetype)
+        
+    except Exception as e:
+        log.exception("❌ Error in predict/sweep endpoint", error=str(e))
         return jsonify({
             "success": False,
             "error": str(e)
@@ -246,7 +467,9 @@ def batch_predict():
 if __name__ == '__main__':
     # Load model on startup
     if load_model():
+        # Pick up retrained .pkl files without a restart
+        registry.start_watcher()
         # Run the Flask app
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        create_app().run(host='0.0.0.0', port=5000, debug=True)
     else:
         print("❌ Failed to load model. Please ensure the model file exists.")
\ No newline at end of file
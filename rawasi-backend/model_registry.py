@@ -0,0 +1,428 @@
+# =========================================================
+# RAWASI Model Registry
+# Loads every cost model bundle and serves them side by side
+# =========================================================
+
+import hashlib
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from cost_engine import DEFAULT_LOCATION, DEFAULT_SECTOR, map_location, predict_outputs, to_costs
+from cost_kernel import compile_kernel, verify_parity
+from instrumentation import get_logger, stage
+
+log = get_logger('models')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "rawasi_model")
+
+# Registered cost models: name -> file and the scale the model predicts on.
+# linreg_rawasi_cost.pkl is left out: its fit is degenerate (coefficients
+# around ±1e10) and it predicts about -1.3e10 SAR for ordinary projects.
+MODEL_SPECS = {
+    "ridge_log": {"file": "rawasi_lin_logbundle.pkl", "target": "log1p"},
+    "linreg_boosted": {"file": "linreg_rawasi_cost_boosted.pkl", "target": "log1p"},
+}
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "ridge_log")
+
+# Number of recent latencies kept per model for percentiles
+LATENCY_WINDOW = 2048
+
+# Shadow requests allowed to queue before new ones are dropped
+SHADOW_MAX_PENDING = 256
+
+# Seconds between model file checks for hot reload (0 disables the watcher)
+RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", 30))
+
+# Known-good input used to warm a freshly loaded model before it serves traffic,
+# spelled with the same trained labels the request path maps to
+WARMUP_ROW = {
+    "sectors": DEFAULT_SECTOR,
+    "macro_region": map_location(DEFAULT_LOCATION)[0],
+    "city": map_location(DEFAULT_LOCATION)[1],
+    "area_project_imputed_m2": 1500.0,
+    "rate_used_sar_m2": 750.0,
+    "duration_days": 360.0
+}
+
+
+def log1p_array(X):
+    """Log1p transformation for numeric features (needed for model unpickling)"""
+    return np.log1p(X)
+
+
+def ensure_pickle_symbols():
+    """
+    The log bundle was pickled from a notebook, so it references
+    __main__.log1p_array. Provide it when __main__ is gunicorn, a CLI or
+    another service rather than model_api.py.
+    """
+    main = sys.modules.get("__main__")
+    if main is not None and not hasattr(main, "log1p_array"):
+        main.log1p_array = log1p_array
+
+
+class LatencyStats:
+    """Rolling latency window with cumulative counters"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+            self.total_ms += ms
+
+    def summary(self):
+        with self._lock:
+            samples = np.array(self._samples, dtype=float)
+            count, total_ms = self.count, self.total_ms
+        if count == 0:
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": count,
+            "mean_ms": round(total_ms / count, 4),
+            "p50_ms": round(float(p50), 4),
+            "p95_ms": round(float(p95), 4),
+            "p99_ms": round(float(p99), 4)
+        }
+
+
+class ShadowStats:
+    """Running comparison between a primary and a shadow model"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.dropped = 0
+        self.sum_abs_diff = 0.0
+        self.sum_rel_diff = 0.0
+
+    def record(self, primary_cost, shadow_cost):
+        abs_diff = abs(shadow_cost - primary_cost)
+        with self._lock:
+            self.count += 1
+            self.sum_abs_diff += abs_diff
+            self.sum_rel_diff += abs_diff / primary_cost if primary_cost else 0.0
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def summary(self):
+        with self._lock:
+            if self.count == 0:
+                return {"count": 0, "errors": self.errors, "dropped": self.dropped}
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "mean_abs_diff": round(self.sum_abs_diff / self.count, 2),
+                "mean_rel_diff": round(self.sum_rel_diff / self.count, 4)
+            }
+
+
+class ModelEntry:
+    """One loaded cost model with its compiled kernel and latency stats"""
+
+    def __init__(self, name, path, target, model):
+        self.name = name
+        self.path = path
+        self.target = target
+        self.model = model
+        self.version = _file_version(path)
+        self.mtime = os.path.getmtime(path)
+        self.loaded_at = time.time()
+        self.latency = LatencyStats()
+        self.batch_latency = LatencyStats()
+        self.kernel = None
+        self.kernel_error = None
+
+        try:
+            self.kernel = compile_kernel(model)
+            verify_parity(self.kernel, model)
+        except Exception as e:
+            self.kernel = None
+            self.kernel_error = str(e)
+            log.warning(f"⚠️ Fast path disabled for '{name}', scoring with the sklearn pipeline",
+                        model=name, error=self.kernel_error)
+
+    @property
+    def predictor(self):
+        """Compiled kernel when available, else the sklearn pipeline"""
+        return self.kernel or self.model
+
+    def predict_cost(self, row):
+        """Predict the cost (SAR) of one row of model features"""
+        start = time.perf_counter()
+        if self.kernel is not None:
+            with stage('model_predict'):
+                output = self.kernel.predict_row(row)
+        else:
+            with stage('dataframe_build'):
+                frame = pd.DataFrame([row])
+            with stage('model_predict'):
+                output = self.model.predict(frame)[0]
+        cost = np.expm1(output) if self.target == "log1p" else output
+        cost = float(max(cost, 0.0))
+        self.latency.record(time.perf_counter() - start)
+        return cost
+
+    def warm_up(self):
+        """Run test predictions through both scoring paths before serving"""
+        cost = self.predict_cost(WARMUP_ROW)
+        outputs = predict_outputs(self.predictor, {col: [value] * 2 for col, value in WARMUP_ROW.items()})
+        if not math.isfinite(cost) or not np.all(np.isfinite(outputs)):
+            raise ValueError("Warm-up prediction is not finite")
+        # Costs are clipped at 0, so a broken model would otherwise serve 0 SAR as a success
+        if not cost > 0 or not np.all(to_costs(outputs, self.target) > 0):
+            raise ValueError(f"Warm-up cost is not positive ({cost:.2f} SAR); check the model and its target")
+        self.latency = LatencyStats()  # Don't count warm-up in traffic latency
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "file": os.path.basename(self.path),
+            "target": self.target,
+            "fast_path": self.kernel is not None,
+            "fast_path_error": self.kernel_error,
+            "loaded_at": self.loaded_at,
+            "latency": self.latency.summary(),
+            "batch_latency": self.batch_latency.summary()
+        }
+
+
+def _file_version(path):
+    """Short content hash used as the model version"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def load_entry(name, spec, model_dir=MODEL_DIR):
+    """Deserialize and warm one model spec into a ModelEntry"""
+    ensure_pickle_symbols()
+    path = os.path.join(model_dir, spec["file"])
+    loaded = joblib.load(path)
+    model = loaded["model"] if isinstance(loaded, dict) else loaded
+    entry = ModelEntry(name, path, spec["target"], model)
+    entry.warm_up()
+    return entry
+
+
+class ModelRegistry:
+    """
+    Holds every registered cost model, selectable by name or version
+
+    Lookups accept "name", "version" or "name@version". Shadow scoring runs
+    a second model on a background thread after the primary response has
+    been computed and records how far it lands from the primary.
+
+    Entries are never mutated once published: a reload builds, warms and
+    verifies a new ModelEntry off the request path, then replaces the
+    whole entries dict in a single assignment. Requests that already
+    resolved an entry finish on it; new requests see the new one.
+    """
+
+    def __init__(self, specs=None, default=DEFAULT_MODEL, model_dir=MODEL_DIR):
+        self.specs = specs or MODEL_SPECS
+        self.default = default
+        self.model_dir = model_dir
+        self._entries = {}
+        self._shadow_stats = {}
+        self._shadow_lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="shadow")
+        self._shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._watcher = None
+        self._stop_watcher = threading.Event()
+        self._mtimes = {}  # name -> mtime of the file last checked for the published entry
+        self._failed_mtimes = {}  # name -> mtime of a file that failed to load
+        self.load_errors = {}
+        self.reload_count = 0
+
+    def add_listener(self, callback):
+        """Call callback(names) after models are (re)loaded"""
+        self._listeners.append(callback)
+
+    def _publish(self, entries, changed):
+        self._entries = entries
+        for callback in self._listeners:
+            callback(changed)
+
+    def load_all(self):
+        """Load every registered model; returns the number loaded"""
+        with self._reload_lock:
+            entries, errors = {}, {}
+            for name, spec in self.specs.items():
+                try:
+                    entry = entries[name] = load_entry(name, spec, self.model_dir)
+                    log.info(f"✅ Model '{name}' loaded", model=name, version=entry.version,
+                             file=spec['file'], fast_path=entry.kernel is not None,
+                             fast_path_error=entry.kernel_error)
+                except Exception as e:
+                    errors[name] = str(e)
+                    log.error(f"❌ Error loading model '{name}'", model=name, error=str(e))
+            self.load_errors = errors
+            self._mtimes = {name: entry.mtime for name, entry in entries.items()}
+            self._publish(entries, list(entries))
+            return len(entries)
+
+    def reload(self, names=None, force=False):
+        """
+        Reload model files that changed on disk without interrupting requests
+
+        Parameters:
+        - names: models to check (default: all registered models)
+        - force: reload even if the file's mtime and content are unchanged
+
+        Returns:
+        - Dictionary of model name -> "reloaded", "unchanged" or an error.
+          A model that fails to load or warm up keeps serving its old entry.
+        """
+        with self._reload_lock:
+            current = self._entries
+            updated = dict(current)
+            results = {}
+
+            for name in names or list(self.specs):
+                spec = self.specs.get(name)
+                if spec is None:
+                    results[name] = "error: unknown model"
+                    continue
+
+                old = current.get(name)
+                path = os.path.join(self.model_dir, spec["file"])
+                mtime = None
+                try:
+                    mtime = os.path.getmtime(path)
+                    if not force and old is not None and mtime == self._mtimes.get(name):
+                        results[name] = "unchanged"
+                        continue
+                    if not force and self._failed_mtimes.get(name) == mtime:
+                        results[name] = f"error: {self.load_errors.get(name)}"
+                        continue
+
+                    entry = load_entry(name, spec, self.model_dir)
+                    if not force and old is not None and entry.version == old.version:
+                        self._mtimes[name] = entry.mtime  # Touched but identical content
+                        results[name] = "unchanged"
+                        continue
+
+                    updated[name] = entry
+                    self._mtimes[name] = entry.mtime
+                    results[name] = "reloaded"
+                    self.load_errors.pop(name, None)
+                    self._failed_mtimes.pop(name, None)
+                    log.info(f"🔄 Model '{name}' reloaded", model=name,
+                             old_version=old.version if old else None, version=entry.version)
+                except Exception as e:
+                    results[name] = f"error: {e}"
+                    self.load_errors[name] = str(e)
+                    self._failed_mtimes[name] = mtime
+                    log.error(f"❌ Error reloading model '{name}', keeping previous version",
+                              model=name, error=str(e))
+
+            changed = [name for name, status in results.items() if status == "reloaded"]
+            if changed:
+                self.reload_count += 1
+                self._publish(updated, changed)
+            return results
+
+    def start_watcher(self, interval=RELOAD_INTERVAL):
+        """Poll model files every interval seconds and hot reload changes"""
+        if interval <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return False
+
+        def watch():
+            while not self._stop_watcher.wait(interval):
+                try:
+                    self.reload()
+                except Exception as e:
+                    log.warning("⚠️ Model watcher error", error=str(e))
+
+        self._stop_watcher.clear()
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+        log.info("👀 Watching for model updates", model_dir=self.model_dir, interval_seconds=interval)
+        return True
+
+    def stop_watcher(self):
+        self._stop_watcher.set()
+
+    def names(self):
+        return list(self._entries)
+
+    def get(self, selector=None):
+        """Resolve a model by name, version or name@version (None = default)"""
+        entries = self._entries
+        if not selector:
+            return entries.get(self.default)
+
+        name, _, version = str(selector).partition("@")
+        entry = entries.get(name)
+        if entry is not None:
+            return entry if not version or entry.version == version else None
+        for entry in entries.values():
+            if entry.version == selector:
+                return entry
+        return None
+
+    def shadow(self, shadow_entry, primary_entry, row, primary_cost):
+        """Score row with shadow_entry in the background and record the gap"""
+        key = f"{primary_entry.name}->{shadow_entry.name}"
+        with self._shadow_lock:
+            stats = self._shadow_stats.setdefault(key, ShadowStats())
+
+        # Never let a slow shadow model build an unbounded backlog
+        if not self._shadow_slots.acquire(blocking=False):
+            stats.record_dropped()
+            return
+
+        def run():
+            try:
+                stats.record(primary_cost, shadow_entry.predict_cost(row))
+            except Exception:
+                stats.record_error()
+            finally:
+                self._shadow_slots.release()
+
+        self._shadow_pool.submit(run)
+
+    def fast_path_errors(self):
+        """Models scoring without the compiled kernel -> why it was disabled"""
+        return {name: entry.kernel_error for name, entry in self._entries.items() if entry.kernel is None}
+
+    def describe(self):
+        return {
+            "default": self.default,
+            "models": [entry.describe() for entry in self._entries.values()],
+            "load_errors": self.load_errors,
+            "reload_count": self.reload_count,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "shadow": {key: stats.summary() for key, stats in self._shadow_stats.items()}
+        }
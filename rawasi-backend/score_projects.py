@@ -0,0 +1,278 @@
+# =========================================================
+# RAWASI Offline Cost Scoring
+# Scores CSV/Parquet project files with a cost bundle, no Flask
+# =========================================================
+#
+# Input columns are the /batch-predict project fields (project_type,
+# size_sqm, location, timeline_months, rate_sar_m2); missing columns and
+# empty cells fall back to the batch defaults. Rows are validated, mapped
+# and scored exactly as the API does (cost_engine.score_projects).
+#
+# The input is read in chunks, chunks are scored across a process pool
+# and results are appended to the output in input order, so memory stays
+# bounded by --chunk-size x (2 x --workers) rows.
+#
+# Run from rawasi-backend/:
+#   python score_projects.py projects.csv scored.csv
+#   python score_projects.py projects.parquet scored.parquet --workers 8 --keep project_id
+#
+# Output format follows the extension: .csv, .parquet, or .ndjson/.jsonl.
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cost_bulk import CSV_FIELDS, render_ndjson, result_row
+from cost_engine import score_projects
+from model_registry import DEFAULT_MODEL, MODEL_SPECS, load_entry
+
+INPUT_FIELDS = ('project_type', 'size_sqm', 'location', 'timeline_months', 'rate_sar_m2')
+
+# Rows read and scored per task
+CHUNK_ROWS = 20_000
+
+# Chunks in flight per worker; bounds memory while keeping workers busy
+CHUNKS_PER_WORKER = 2
+
+# Column types of a scored chunk (Parquet schema)
+OUTPUT_TYPES = {
+    'index': 'int64', 'success': 'bool', 'predicted_cost': 'float64',
+    'confidence_lower': 'float64', 'confidence_upper': 'float64', 'cost_per_sqm': 'float64',
+    'project_type': 'string', 'size_sqm': 'float64', 'location': 'string',
+    'timeline_months': 'int64', 'rate_sar_m2': 'float64', 'error': 'string'
+}
+
+# Model used by this process (set once per worker)
+_entry = None
+
+
+def file_format(path):
+    """'csv', 'parquet' or 'ndjson' from a file extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    return 'csv'
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("❌ Parquet files need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows from a CSV or Parquet file"""
+    if file_format(path) == 'parquet':
+        parquet = _pyarrow().parquet.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        # round_trip parses numbers exactly as float() does, like the API's JSON/CSV readers
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype={'project_type': str, 'location': str},
+                               float_precision='round_trip')
+
+
+def to_projects(frame):
+    """Project dicts for a chunk, leaving out empty cells"""
+    columns = [col for col in INPUT_FIELDS if col in frame.columns]
+    return [
+        {field: value for field, value in record.items() if value is not None and value == value}
+        for record in frame[columns].to_dict('records')
+    ]
+
+
+def init_worker(model_name):
+    """Load the model once per process (inherited as-is from the parent under fork)"""
+    global _entry
+    if _entry is None:
+        _entry = load_entry(model_name, MODEL_SPECS[model_name])
+
+
+def render(results, kept, output_format, header=True):
+    """
+    Serialize a scored chunk
+
+    Parameters:
+    - results: indexed score_projects results
+    - kept: dict of copied input column -> values, one per result
+
+    Returns:
+    - CSV/NDJSON text with the same values as the API responses
+      (cost_bulk), or an Arrow table for Parquet
+    """
+    if output_format == 'parquet':
+        pa = _pyarrow()
+        scored = pd.DataFrame(map(result_row, results), columns=CSV_FIELDS)
+        for col, values in kept.items():
+            scored[col] = values
+        fields = [pa.field(col, pa.type_for_alias(OUTPUT_TYPES[col])) for col in CSV_FIELDS]
+        schema = pa.schema(fields + list(pa.Schema.from_pandas(scored[list(kept)], preserve_index=False)))
+        return pa.Table.from_pandas(scored, schema=schema, preserve_index=False)
+    kept_rows = list(zip(*kept.values())) if kept else [()] * len(results)
+    if output_format == 'ndjson':
+        if kept:
+            results = [dict(result, **dict(zip(kept, values))) for result, values in zip(results, kept_rows)]
+        return ''.join(render_ndjson([results]))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_FIELDS + tuple(kept))
+    writer.writerows(result_row(result) + values for result, values in zip(results, kept_rows))
+    return buffer.getvalue()
+
+
+def score_chunk(start, frame, keep=(), output_format='csv'):
+    """
+    Score one chunk of projects
+
+    Parameters:
+    - start: row number of the chunk's first row in the input
+    - frame: input rows
+    - keep: input columns copied to the output (e.g. an id)
+    - output_format: 'csv', 'ndjson' or 'parquet'
+
+    Returns:
+    - (rows, failed, rendered chunk); rendering here keeps the parent
+      process down to reading and appending
+    """
+    results = score_projects(_entry.predictor, to_projects(frame), target=_entry.target)
+    for i, result in enumerate(results):
+        result['index'] = start + i
+    # Plain Python values (ints stay ints, empty cells become None) for json/csv
+    kept = {col: [None if value != value else value for value in frame[col].tolist()] for col in keep}
+    failed = sum(not result['success'] for result in results)
+    return len(results), failed, render(results, kept, output_format, header=start == 0)
+
+
+class ResultWriter:
+    """Appends rendered chunks to a CSV, NDJSON or Parquet file, in order"""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = file_format(path)
+        self.rows = 0
+        self.failed = 0
+        self._file = None
+        self._parquet = None
+        if self.format != 'parquet':
+            self._file = open(path, 'w', encoding='utf-8', newline='')
+
+    def write(self, chunk):
+        rows, failed, rendered = chunk
+        if self._file is not None:
+            self._file.write(rendered)
+        else:
+            if self._parquet is None:
+                self._parquet = _pyarrow().parquet.ParquetWriter(self.path, rendered.schema)
+            elif rendered.schema != self._parquet.schema:
+                rendered = rendered.cast(self._parquet.schema)
+            self._parquet.write_table(rendered)
+        self.rows += rows
+        self.failed += failed
+
+    def close(self):
+        if self._file is not None:
+            # Empty input still produces a header-only CSV
+            if self.format == 'csv' and self._file.tell() == 0:
+                self._file.write(','.join(CSV_FIELDS) + '\n')
+            self._file.close()
+        elif self._parquet is not None:
+            self._parquet.close()
+
+
+def score_file(input_path, output_path, model_name=DEFAULT_MODEL, workers=None,
+               chunk_rows=CHUNK_ROWS, keep=(), progress=True):
+    """
+    Score every project in input_path and write the results to output_path
+
+    Parameters:
+    - model_name: registered cost model (see model_registry.MODEL_SPECS)
+    - workers: scoring processes (default: CPU count; 1 scores in this process)
+    - chunk_rows: rows per scoring task
+    - keep: input columns copied to the output
+
+    Returns:
+    - Dictionary with rows, failed and seconds
+    """
+    workers = workers or os.cpu_count() or 1
+    start_time = time.perf_counter()
+    # Loaded before the pool starts so forked workers share it
+    init_worker(model_name)
+    writer = ResultWriter(output_path)
+
+    def report():
+        if progress:
+            elapsed = time.perf_counter() - start_time
+            print(f"⏳ {writer.rows:,} rows ({writer.rows / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+
+    def chunks():
+        start = 0
+        for frame in read_chunks(input_path, chunk_rows):
+            missing = [col for col in keep if col not in frame.columns]
+            if missing:
+                raise SystemExit(f"❌ Columns not in input: {', '.join(missing)}")
+            yield start, frame
+            start += len(frame)
+
+    try:
+        if workers == 1:
+            for start, frame in chunks():
+                writer.write(score_chunk(start, frame, keep, writer.format))
+                report()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(model_name,)) as pool:
+                pending = deque()
+                for start, frame in chunks():
+                    pending.append(pool.submit(score_chunk, start, frame, keep, writer.format))
+                    if len(pending) >= workers * CHUNKS_PER_WORKER:
+                        writer.write(pending.popleft().result())
+                        report()
+                while pending:
+                    writer.write(pending.popleft().result())
+                    report()
+    finally:
+        writer.close()
+
+    return {
+        'rows': writer.rows,
+        'failed': writer.failed,
+        'seconds': round(time.perf_counter() - start_time, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet project file with a RAWASI cost model')
+    parser.add_argument('input', help='projects (.csv or .parquet)')
+    parser.add_argument('output', help='results (.csv, .parquet, .ndjson or .jsonl)')
+    parser.add_argument('--model', default=DEFAULT_MODEL, choices=sorted(MODEL_SPECS), help='cost model')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='scoring processes')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_ROWS, help='rows per scoring task')
+    parser.add_argument('--keep', nargs='*', default=[], help='input columns copied to the output (e.g. an id)')
+    parser.add_argument('--quiet', action='store_true', help='no progress output')
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error('--workers and --chunk-size must be at least 1')
+
+    summary = score_file(args.input, args.output, args.model, args.workers,
+                         args.chunk_size, args.keep, progress=not args.quiet)
+    print(f"✅ {summary['rows']:,} rows scored with {args.model} in {summary['seconds']:.1f}s "
+          f"({summary['failed']:,} failed) → {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# =========================================================
+# RAWASI Technique Matching
+# Single-pass keyword matching for construction technique names
+# =========================================================
+
+import re
+from functools import lru_cache
+
+# Distinct input strings remembered per matcher
+MATCH_CACHE_SIZE = 4096
+
+
+class KeywordAutomaton:
+    """
+    Finds every keyword occurring (as a substring) in a text in one scan
+
+    All keywords are compiled into a single regex: an alternation ordered
+    longest-first inside a lookahead, so the scan tests every start
+    position without consuming text. At each position only the longest
+    keyword starting there is reported; any shorter keyword occurring at
+    that position is a prefix of it, so each keyword is expanded at build
+    time to the set of keywords it contains. Matching is case-insensitive
+    and results are memoized per text.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(k.lower() for k in keywords if k)
+        ordered = sorted(self.keywords, key=lambda k: (-len(k), k))
+        self._pattern = re.compile(
+            '(?=(' + '|'.join(re.escape(k) for k in ordered) + '))'
+        ) if ordered else None
+        self._contained = {
+            k: frozenset(other for other in self.keywords if other in k)
+            for k in self.keywords
+        }
+        self.find = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._find)
+
+    def _find(self, text):
+        """Frozenset of keywords occurring in text"""
+        if self._pattern is None:
+            return frozenset()
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            found |= self._contained[match.group(1)]
+        return frozenset(found)
+
+
+class TechniqueClassifier:
+    """
+    Maps free-text technique names to canonical ids
+
+    Parameters:
+    - groups: dict of canonical id -> keywords (names and aliases); an id
+      matches when any of its keywords occurs in the text. Ids are ranked
+      in the dict's order.
+    """
+
+    def __init__(self, groups):
+        self.order = list(groups)
+        self.automaton = KeywordAutomaton(k for keywords in groups.values() for k in keywords)
+        self._ids_by_keyword = {}
+        for technique_id, keywords in groups.items():
+            for keyword in keywords:
+                if keyword:
+                    self._ids_by_keyword.setdefault(keyword.lower(), []).append(technique_id)
+        self.classify = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._classify)
+
+    def _classify(self, text):
+        """Ids matching text, in rank order"""
+        matched = set()
+        for keyword in self.automaton.find(text):
+            matched.update(self._ids_by_keyword[keyword])
+        return tuple(technique_id for technique_id in self.order if technique_id in matched)
+
+    def first(self, text, default=None):
+        """Highest-ranked id matching text, or default"""
+        matched = self.classify(text)
+        return matched[0] if matched else default
@@ -0,0 +1,66 @@
+import glob
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from cost_kernel import compile_kernel
+from model_registry import MODEL_DIR, ensure_pickle_symbols
+
+BUNDLES = sorted(glob.glob(os.path.join(MODEL_DIR, '*.pkl')))
+
+
+def load_pipeline(path):
+    ensure_pickle_symbols()
+    loaded = joblib.load(path)
+    return loaded['model'] if isinstance(loaded, dict) else loaded
+
+
+def parity_frame(kernel, rows=2000, seed=0):
+    """Every known category at least once, unseen values in every column, random numerics"""
+    rng = np.random.default_rng(seed)
+    levels = [list(table) for table in kernel.cat_tables]
+    n_rows = max(rows, max(len(values) for values in levels))
+    columns = {
+        col: [values[i % len(values)] for i in rng.permutation(n_rows)]
+        for col, values in zip(kernel.cat_cols, levels)
+    }
+    for col in kernel.cat_cols:
+        unseen = rng.choice(n_rows, size=n_rows // 10, replace=False)
+        for i in unseen:
+            columns[col][i] = 'غير معروف'
+    for col in kernel.num_cols:
+        columns[col] = rng.uniform(1.0, 1e5, size=n_rows)
+    return pd.DataFrame(columns)
+
+
+@pytest.mark.parametrize('path', BUNDLES, ids=os.path.basename)
+def test_kernel_matches_pipeline(path):
+    pipeline = load_pipeline(path)
+    kernel = compile_kernel(pipeline)
+    frame = parity_frame(kernel)
+
+    expected = pipeline.predict(frame)
+    scale = np.maximum(1.0, np.abs(expected))
+    assert np.max(np.abs(kernel.predict(frame) - expected) / scale) < 1e-9
+
+    sample = range(0, len(frame), 97)
+    scalar = np.array([kernel.predict_row(frame.iloc[i]) for i in sample])
+    assert np.max(np.abs(scalar - expected[list(sample)]) / scale[list(sample)]) < 1e-9
+
+
+@pytest.mark.parametrize('path', BUNDLES, ids=os.path.basename)
+def test_unseen_categories_contribute_nothing(path):
+    pipeline = load_pipeline(path)
+    kernel = compile_kernel(pipeline)
+    row = {col: next(iter(table)) for col, table in zip(kernel.cat_cols, kernel.cat_tables)}
+    row.update({col: 1500.0 for col in kernel.num_cols})
+    for col, table in zip(kernel.cat_cols, kernel.cat_tables):
+        unseen = dict(row, **{col: 'غير معروف'})
+        frame = pd.DataFrame([row, unseen])
+        expected = pipeline.predict(frame)
+        assert kernel.predict(frame) == pytest.approx(expected, rel=1e-9)
+        assert kernel.predict_row(row) - kernel.predict_row(unseen) == pytest.approx(
+            table[row[col]], rel=1e-6, abs=1e-6 * max(1.0, abs(expected[0])))
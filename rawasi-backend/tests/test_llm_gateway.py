@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from llm_gateway import CircuitBreaker, CircuitOpen, LLMBusy, LLMGateway, StubModel
+
+
+def failing(contents):
+    raise RuntimeError("upstream down")
+
+
+def make_gateway(**kwargs):
+    gateway = LLMGateway(backend='stub', max_concurrency=1, queue_timeout=0.05,
+                         timeout=1, retries=0, backoff=0, **kwargs)
+    stub = gateway.use_stub(StubModel(responder=failing))
+    gateway._breakers['m'] = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    return gateway, stub
+
+
+def test_breaker_recovers_after_busy_half_open_trial():
+    gateway, stub = make_gateway()
+    breaker = gateway._breakers['m']
+
+    with pytest.raises(RuntimeError):
+        gateway.generate('m', 'x')
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpen):
+        gateway.generate('m', 'x')
+
+    # Reset timeout passes while every slot is held by a stuck upstream call
+    time.sleep(0.15)
+    gateway._slots.acquire()
+    with pytest.raises(LLMBusy):
+        gateway.generate('m', 'x')
+    assert breaker.state != 'half_open'
+    gateway._slots.release()
+
+    stub.responder = lambda contents: "ok"
+    assert gateway.generate('m', 'x').text == "ok"
+    assert breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_breaker():
+    gateway, stub = make_gateway()
+    breaker = gateway._breakers['m']
+    with pytest.raises(RuntimeError):
+        gateway.generate('m', 'x')
+    time.sleep(0.15)
+    with pytest.raises(RuntimeError):
+        gateway.generate('m', 'x')
+    assert breaker.state == 'open'
+    assert breaker.trips == 2
+
+
+def test_interrupted_trial_reopens_breaker():
+    gateway, stub = make_gateway()
+    breaker = gateway._breakers['m']
+    with pytest.raises(RuntimeError):
+        gateway.generate('m', 'x')
+    time.sleep(0.15)
+    gateway._executor.shutdown()  # submit raises
+    with pytest.raises(RuntimeError):
+        gateway.generate('m', 'x')
+    assert breaker.state == 'open'
+    assert gateway._slots.acquire(blocking=False)
+
+
+def test_stale_half_open_trial_is_replaced():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()  # trial in flight
+    time.sleep(0.15)
+    assert breaker.allow()  # the first trial never reported back
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_open_breaker_rejects_without_waiting_for_a_slot():
+    gateway, stub = make_gateway()
+    gateway._breakers['m'].reset_timeout = 60
+    with pytest.raises(RuntimeError):
+        gateway.generate('m', 'x')
+    gateway._slots.acquire()
+    start = time.perf_counter()
+    with pytest.raises(CircuitOpen):
+        gateway.generate('m', 'x')
+    assert time.perf_counter() - start < 0.05
+    gateway._slots.release()
@@ -0,0 +1,72 @@
+import pytest
+
+import Time
+from llm_gateway import StubModel, gateway
+
+
+def failing(contents):
+    raise RuntimeError("upstream down")
+
+
+@pytest.fixture
+def predictor():
+    gateway.use_stub(StubModel(responder=failing))
+    predictor = Time.ModernConstructionTimePredictor()
+    assert predictor.ai_enabled
+    yield predictor
+    gateway.use_stub()
+
+
+def test_fallback_uses_the_real_area_not_the_cache_bucket(predictor):
+    techniques = ['Precast']
+    result = predictor.predict_construction_time(20077, 2, 3, techniques)
+    expected = round(predictor.modern_fallback_estimation(20077, 2, 3, techniques), 1)
+    assert result['method'] == 'fallback'
+    assert result['area_sqm'] == 20077
+    assert result['predicted_months'] == expected
+
+    # Another area in the same bucket gets its own fallback
+    assert predictor.prediction_key(20080, 2, 3, techniques) == predictor.prediction_key(20077, 2, 3, techniques)
+    other = predictor.predict_construction_time(20080, 2, 3, techniques)
+    assert other['predicted_months'] == round(predictor.modern_fallback_estimation(20080, 2, 3, techniques), 1)
+
+
+@pytest.fixture
+def client():
+    app = Time.create_app()
+    ai_enabled, Time.predictor.ai_enabled = Time.predictor.ai_enabled, False
+    yield app.test_client()
+    Time.predictor.ai_enabled = ai_enabled
+
+
+@pytest.mark.parametrize('size', [float('nan'), float('inf'), float('-inf'), 'nan', 0, -5])
+def test_invalid_area_is_rejected_on_every_route(client, size):
+    error = "sizeSqm must be a positive number"
+
+    response = client.post('/api/predict-timeline', json={'sizeSqm': size})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+    response = client.post('/api/predict-timeline/batch', json={'projects': [{'sizeSqm': size}, {'sizeSqm': 900}]})
+    first, second = response.get_json()['predictions']
+    assert first == {'success': False, 'index': 0, 'error': error}
+    assert second['success']
+
+    response = client.post('/api/predict-timeline/batch', json={'grid': {'sizeSqm': [900, size]}})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == error
+
+
+def test_batch_matches_scalar(client):
+    projects = [
+        {'sizeSqm': size, 'Nfloors': floors, 'complexity': complexity, 'techNeeds': techniques}
+        for size in (1, 120.5, 1500, 20077, 1e9)
+        for floors in (1, 10, 40)
+        for complexity in (1, 5)
+        for techniques in ([], ['Precast'], ['Tunnel Form'], ['Steel Frame'])
+    ]
+    batch = client.post('/api/predict-timeline/batch', json={'projects': projects}).get_json()['predictions']
+    for project, result in zip(projects, batch):
+        scalar = client.post('/api/predict-timeline', json=project).get_json()
+        assert result['predicted_months'] == scalar['predicted_months']
+        assert type(result['predicted_months']) is type(scalar['predicted_months'])
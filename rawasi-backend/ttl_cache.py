@@ -0,0 +1,134 @@
+# =========================================================
+# RAWASI TTL Cache
+# Thread-safe in-process LRU cache with time-based expiry
+# =========================================================
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after ttl seconds
+
+    Parameters:
+    - maxsize: maximum number of entries before least-recently-used eviction
+    - ttl: entry lifetime in seconds (None disables expiry)
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on miss/expiry"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Insert or refresh key, evicting the oldest entries if full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after the underlying model changes)"""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Counters for health/metrics endpoints"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution
+
+    The first caller for a key runs fn; callers arriving while it is in
+    flight wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the in-flight call
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        """Run fn(*args) for key unless an identical call is already running"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        """Counters for health/metrics endpoints"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "coalesced": self.coalesced
+            }